@@ -0,0 +1,151 @@
+# Векторизованный движок для многих реплик сразу
+# Все K популяций лежат в одних массивах с ведущей осью реплик (K, N, ...),
+# и каждый шаг - это несколько больших операций numpy вместо K маленьких
+
+import numpy as np
+from population import Status, QUADRANT_OFFSETS, QUARANTINE_SLOWDOWN, quarantine_switch
+from spatial import CellGrid
+from history import History
+
+
+class BatchPopulation:
+    """K независимых реплик Population с одинаковыми параметрами"""
+
+    def __init__(self, replicas=100, size=200, initial_infected=5, infection_rate=0.3,
+                 recovery_time=150, immunity_time=200, interaction_radius=0.03,
+                 movement_speed=0.01, quarantine_enabled=False, quarantine_threshold=30,
+                 vaccination_enabled=False, vaccination_start=300, vaccination_rate=3,
+                 rng=None, history_size=None):
+
+        # Основные параметры (те же, что у Population)
+        self.replicas = replicas
+        self.size = size
+        self.infection_rate = infection_rate
+        self.recovery_time = recovery_time
+        self.immunity_time = immunity_time
+        self.interaction_radius = interaction_radius
+        self.grid = CellGrid(interaction_radius)
+        self.rng = np.random.default_rng(rng)
+
+        self.quarantine_enabled = quarantine_enabled
+        self.quarantine_threshold = quarantine_threshold / 100
+        self.vaccination_enabled = vaccination_enabled
+        self.vaccination_start = vaccination_start
+        self.vaccination_rate = vaccination_rate
+
+        # Позиции: каждый агент в своем квадранте, как в Population
+        quadrants = np.arange(size) % 4
+        self.positions = self.rng.random((replicas, size, 2)) * 0.4 + QUADRANT_OFFSETS[quadrants]
+        self.velocities = (self.rng.random((replicas, size, 2)) - 0.5) * movement_speed
+
+        self.status = np.zeros((replicas, size), dtype=int)
+        self.timers = np.zeros((replicas, size), dtype=int)
+
+        # В каждой реплике заражаем initial_infected случайных людей
+        if initial_infected > 0:
+            keys = self.rng.random((replicas, size))
+            first = np.argpartition(keys, initial_infected - 1, axis=1)[:, :initial_infected]
+            rows = np.arange(replicas)[:, np.newaxis]
+            self.status[rows, first] = Status.INFECTED.value
+            self.timers[rows, first] = self.recovery_time
+
+        # История: строка (K, 4) на каждый шаг
+        self.history = History(row_shape=(replicas, 4), maxlen=history_size)
+        self.counts = self.census()
+        self.time = 0
+
+        # Карантин у каждой реплики свой
+        self.original_movement_speed = movement_speed
+        self.quarantine_active = np.zeros(replicas, dtype=bool)
+        self.current_movement_speed = np.full(replicas, float(movement_speed))
+
+    def census(self):
+        """Количество S, I, R, V в каждой реплике, массив (K, 4)"""
+        offsets = 4 * np.arange(self.replicas)[:, np.newaxis]
+        return np.bincount((self.status + offsets).ravel(),
+                           minlength=4 * self.replicas).reshape(self.replicas, 4)
+
+    def update(self):
+        """Один шаг всех реплик сразу"""
+        self.time += 1
+        K, N = self.replicas, self.size
+
+        # Карантин по каждой реплике отдельно (с тем же гистерезисом)
+        if self.quarantine_enabled:
+            infected_percent = self.counts[:, Status.INFECTED.value] / N
+            start, stop = quarantine_switch(infected_percent, self.quarantine_threshold, self.quarantine_active)
+            self.quarantine_active[start] = True
+            self.quarantine_active[stop] = False
+            self.current_movement_speed[start] = self.original_movement_speed * QUARANTINE_SLOWDOWN
+            self.current_movement_speed[stop] = self.original_movement_speed
+
+        # Движение и отражение от границ
+        self.positions += self.velocities
+        out_of_bounds = (self.positions <= 0) | (self.positions >= 1)
+        self.velocities[out_of_bounds] *= -1
+        np.clip(self.positions, 0, 1, out=self.positions)
+
+        self.velocities += (self.rng.random((K, N, 2)) - 0.5) * 0.002
+
+        # Ограничение скорости, у каждой реплики свой предел
+        speeds = np.linalg.norm(self.velocities, axis=2)
+        limit = (self.current_movement_speed * 1.5)[:, np.newaxis]
+        too_fast = speeds > limit
+        if np.any(too_fast):
+            scale = np.broadcast_to(limit, speeds.shape)[too_fast] / speeds[too_fast]
+            self.velocities[too_fast] *= scale[:, np.newaxis]
+
+        # Заражение: все реплики в одной сетке, номер реплики - группа клетки
+        flat_status = self.status.reshape(-1)
+        infected = np.nonzero(flat_status == Status.INFECTED.value)[0]
+        susceptible = np.nonzero(flat_status == Status.SUSCEPTIBLE.value)[0]
+
+        if len(infected) > 0 and len(susceptible) > 0:
+            flat_positions = self.positions.reshape(-1, 2)
+            contacts = self.grid.contact_counts(
+                flat_positions[susceptible], flat_positions[infected],
+                susceptible // N, infected // N,
+            )
+            exposed = np.nonzero(contacts)[0]
+            if len(exposed) > 0:
+                p_infection = 1.0 - (1.0 - self.infection_rate) ** contacts[exposed]
+                newly_infected = susceptible[exposed[self.rng.random(len(exposed)) < p_infection]]
+                flat_status[newly_infected] = Status.INFECTED.value
+                self.timers.reshape(-1)[newly_infected] = self.recovery_time
+
+        # Таймеры, выздоровление и потеря иммунитета (как в Population)
+        infected_mask = self.status == Status.INFECTED.value
+        self.timers[infected_mask] -= 1
+
+        recovery_mask = infected_mask & (self.timers <= 0)
+        self.status[recovery_mask] = Status.RECOVERED.value
+        self.timers[recovery_mask] = self.immunity_time
+
+        recovered_mask = self.status == Status.RECOVERED.value
+        self.timers[recovered_mask & (self.timers > 0)] -= 1
+        self.status[recovered_mask & (self.timers <= 0)] = Status.SUSCEPTIBLE.value
+
+        # Вакцинация: в каждой реплике до vaccination_rate случайных восприимчивых
+        if self.vaccination_enabled and self.time >= self.vaccination_start and self.vaccination_rate > 0:
+            susceptible_mask = self.status == Status.SUSCEPTIBLE.value
+            keys = self.rng.random((K, N))
+            keys[~susceptible_mask] = 2.0  # невосприимчивых в конец
+            rate = min(self.vaccination_rate, N)
+            chosen = np.argpartition(keys, rate - 1, axis=1)[:, :rate]
+            rows = np.broadcast_to(np.arange(K)[:, np.newaxis], chosen.shape)
+            valid = keys[rows, chosen] < 2.0
+            self.status[rows[valid], chosen[valid]] = Status.VACCINATED.value
+
+        self.counts = self.census()
+        self.history.append(self.counts)
+
+    def run(self, steps):
+        """Прогоняет все реплики на steps шагов"""
+        self.history.reserve(steps)
+        for _ in range(steps):
+            self.update()
+        return self
+
+    def curves(self):
+        """История в виде массива (K, шаги, 4), как EnsembleResult.curves"""
+        return np.moveaxis(self.history.data, 0, 1)
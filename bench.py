@@ -0,0 +1,174 @@
+# Бенчмарк масштабирования: шагов в секунду и пиковая память для разных движков
+# Перебирает размер популяции и долю зараженных, результат пишет в JSON Lines
+# (одна строка на конфигурацию), чтобы его можно было сравнивать между версиями.
+#
+#   python bench.py --sizes 1e2 1e3 1e4 1e5 1e6 --infected 0.01 0.1 --output bench.jsonl
+#
+# Каждая конфигурация считается в отдельном процессе: если на ней кончится
+# память (MemoryError или OOM killer), в вывод попадает строка с полем error,
+# а остальные конфигурации считаются дальше.
+
+import argparse
+import json
+import multiprocessing
+import platform
+import sys
+import time
+import tracemalloc
+import numpy as np
+from population import Population, ENGINE_VERSION
+from batch import BatchPopulation
+from profiling import PhaseStats
+
+# Движки: как создать популяцию и сколько агентов в ней на самом деле
+ENGINES = {
+    'loop': lambda size, infected, args: Population(size=size, initial_infected=infected, engine='loop',
+                                                    rng=args.seed, verbose=False, stats=True),
+    'grid': lambda size, infected, args: Population(size=size, initial_infected=infected,
+                                                    rng=args.seed, verbose=False, stats=True),
+    'grid-compact': lambda size, infected, args: Population(size=size, initial_infected=infected, compact=True,
+                                                            rng=args.seed, verbose=False, stats=True),
+    'batch': lambda size, infected, args: BatchPopulation(replicas=args.replicas, size=size,
+                                                          initial_infected=infected, rng=args.seed),
+}
+
+# Старый цикл квадратичный, на больших популяциях его не ждем
+MAX_LOOP_SIZE = 2000
+
+
+def _advance(population, steps):
+    step = getattr(population, 'step', population.update)
+    for _ in range(steps):
+        step()
+
+
+def _state_bytes(population):
+    return int(sum(getattr(population, name).nbytes
+                   for name in ('positions', 'velocities', 'status', 'timers')))
+
+
+def bench_one(engine, size, infected_fraction, args):
+    """Замер одной конфигурации, возвращает словарь для JSON"""
+    infected = max(1, int(round(size * infected_fraction)))
+    population = ENGINES[engine](size, infected, args)
+    _advance(population, args.warmup)
+
+    stats = getattr(population, 'stats', None)
+    if isinstance(stats, PhaseStats):
+        stats.reset()
+
+    start = time.perf_counter()
+    _advance(population, args.steps)
+    elapsed = time.perf_counter() - start
+    phases = stats.mean() if isinstance(stats, PhaseStats) else None
+
+    # Память меряем отдельными шагами: tracemalloc сам замедляет выполнение
+    tracemalloc.start()
+    _advance(population, args.memory_steps)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    agents = size * (args.replicas if engine == 'batch' else 1)
+    result = {
+        'engine': engine,
+        'size': size,
+        'agents': agents,
+        'infected_fraction': infected_fraction,
+        'steps': args.steps,
+        'seconds': elapsed,
+        'steps_per_sec': args.steps / elapsed,
+        'agent_steps_per_sec': agents * args.steps / elapsed,
+        'state_bytes': _state_bytes(population),
+        'peak_step_alloc_bytes': peak,
+    }
+    if phases is not None:
+        result['phases_ms'] = {phase: seconds * 1000 for phase, seconds in phases.items()}
+    return result
+
+
+def _bench_child(conn, engine, size, infected_fraction, args):
+    try:
+        result = bench_one(engine, size, infected_fraction, args)
+    except Exception as e:
+        result = {'error': f"{type(e).__name__}: {e}"}
+    conn.send(result)
+    conn.close()
+
+
+def bench_isolated(engine, size, infected_fraction, args):
+    """bench_one в отдельном процессе; если процесс упал, возвращает строку с error"""
+    receiver, sender = multiprocessing.Pipe(duplex=False)
+    process = multiprocessing.Process(target=_bench_child, args=(sender, engine, size, infected_fraction, args))
+    process.start()
+    sender.close()
+    try:
+        result = receiver.recv()
+    except EOFError:
+        result = None
+    process.join()
+    if result is None:
+        # Процесс умер, не успев ничего прислать (чаще всего его убил OOM killer)
+        code = process.exitcode
+        reason = f"убит сигналом {-code}" if code < 0 else f"код выхода {code}"
+        result = {'error': f"процесс бенчмарка завершился: {reason}"}
+    if 'error' in result:
+        result = {
+            'engine': engine,
+            'size': size,
+            'agents': size * (args.replicas if engine == 'batch' else 1),
+            'infected_fraction': infected_fraction,
+            **result,
+        }
+    return result
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Бенчмарк движков симуляции")
+    parser.add_argument('--engines', nargs='+', default=['grid', 'grid-compact', 'batch', 'loop'],
+                        choices=sorted(ENGINES))
+    # По умолчанию - то, что считается за несколько минут на обычной машине. Миллион
+    # агентов при 10% зараженных - это около миллиарда пар-кандидатов и десятки
+    # секунд на шаг, такие размеры надо просить явно
+    parser.add_argument('--sizes', nargs='+', type=float, default=[1e2, 1e3, 1e4, 1e5])
+    parser.add_argument('--infected', nargs='+', type=float, default=[0.01, 0.1],
+                        help="доли зараженных в начале")
+    parser.add_argument('--steps', type=int, default=20)
+    parser.add_argument('--warmup', type=int, default=2)
+    parser.add_argument('--memory-steps', type=int, default=2)
+    parser.add_argument('--replicas', type=int, default=16, help="реплик для движка batch")
+    parser.add_argument('--max-agents', type=float, default=1e6,
+                        help="пропускать конфигурации, где агентов больше")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--in-process', action='store_true',
+                        help="считать в этом же процессе (для профилировщика; падение остановит весь прогон)")
+    parser.add_argument('--output', help="файл JSON Lines (по умолчанию stdout)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    meta = {
+        'engine_version': ENGINE_VERSION,
+        'numpy': np.__version__,
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+    }
+    out = open(args.output, 'w', encoding='utf-8') if args.output else sys.stdout
+    try:
+        for engine in args.engines:
+            for size in (int(s) for s in args.sizes):
+                agents = size * (args.replicas if engine == 'batch' else 1)
+                if (engine == 'loop' and size > MAX_LOOP_SIZE) or agents > args.max_agents:
+                    continue
+                for fraction in args.infected:
+                    run = bench_one if args.in_process else bench_isolated
+                    result = run(engine, size, fraction, args)
+                    out.write(json.dumps({**meta, **result}) + '\n')
+                    out.flush()
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+
+if __name__ == '__main__':
+    main()
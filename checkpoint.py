@@ -0,0 +1,118 @@
+# Сохранение и восстановление состояния симуляции (чекпойнты)
+# Все состояние Population, включая генератор случайных чисел, пишется в один
+# сжатый .npz файл. После загрузки симуляция продолжается бит в бит так же,
+# как продолжилась бы без остановки.
+
+import json
+import os
+import numpy as np
+from population import Population
+
+# Массивы состояния популяции
+STATE_ARRAYS = ('positions', 'velocities', 'status', 'timers', 'counts')
+# Скалярное состояние, которое меняется во время прогона
+STATE_SCALARS = ('time', 'quarantine_active', 'current_movement_speed', 'quarantine_threshold',
+                 'total_infections', 'quarantine_days')
+
+
+def _constructor_params(population):
+    """Аргументы конструктора, из которых популяцию можно собрать заново"""
+    return {
+        'size': population.size,
+        'infection_rate': population.infection_rate,
+        'recovery_time': population.recovery_time,
+        'immunity_time': population.immunity_time,
+        'interaction_radius': population.interaction_radius,
+        'movement_speed': population.original_movement_speed,
+        'quarantine_enabled': population.quarantine_enabled,
+        'quarantine_threshold': population.quarantine_threshold * 100,
+        'vaccination_enabled': population.vaccination_enabled,
+        'vaccination_start': population.vaccination_start,
+        'vaccination_rate': population.vaccination_rate,
+        'engine': population.engine,
+        'verbose': population.verbose,
+        'history_size': population.history.maxlen,
+        'compact': population.compact,
+        'transitions': population.transitions,
+        # Журнал пересоздается пустым и заполняется из файла, без журнала - None
+        'events': True if population.events is not None else None,
+    }
+
+
+def _to_json(value):
+    # numpy-скаляры в обычные питоновские типы
+    return value.item() if isinstance(value, np.generic) else value
+
+
+def save_checkpoint(population, path):
+    """Пишет полное состояние популяции в файл path.
+
+    Файл сначала пишется во временный и потом переименовывается, так что при
+    падении посреди записи старый чекпойнт остается целым.
+    """
+    population.sync_timers()
+    meta = {
+        'params': {k: _to_json(v) for k, v in _constructor_params(population).items()},
+        'state': {k: _to_json(getattr(population, k)) for k in STATE_SCALARS},
+        'history_total': population.history.total,
+        'rng': population.rng.bit_generator.state,
+    }
+    arrays = {name: getattr(population, name) for name in STATE_ARRAYS}
+    arrays['history'] = population.history.data
+    if population.events is not None:
+        arrays.update({f'events_{name}': column for name, column in population.events.state().items()})
+
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        np.savez_compressed(f, meta=np.frombuffer(json.dumps(meta).encode('utf-8'), dtype=np.uint8),
+                            **arrays)
+    os.replace(tmp_path, path)
+    return path
+
+
+def load_checkpoint(path, **overrides):
+    """Восстанавливает популяцию из файла.
+
+    overrides - аргументы конструктора Population, которые надо поменять
+    (например, vaccination_start=100), чтобы запустить сценарий "что если"
+    из уже разогнанного состояния эпидемии.
+    """
+    with np.load(path) as data:
+        meta = json.loads(data['meta'].tobytes().decode('utf-8'))
+        arrays = {name: data[name] for name in STATE_ARRAYS + ('history',)}
+        events = {name[len('events_'):]: data[name] for name in data.files if name.startswith('events_')}
+
+    params = dict(meta['params'])
+    params.update(overrides)
+    population = Population(initial_infected=0, **params)
+
+    for name in STATE_ARRAYS:
+        setattr(population, name, arrays[name])
+    for name, value in meta['state'].items():
+        setattr(population, name, value)
+    if 'quarantine_threshold' in overrides:
+        population.quarantine_threshold = overrides['quarantine_threshold'] / 100
+    if 'movement_speed' in overrides:
+        factor = 0.3 if population.quarantine_active else 1.0
+        population.current_movement_speed = population.original_movement_speed * factor
+
+    population.history.load(arrays['history'], meta['history_total'])
+    if population.events is not None and events:
+        population.events.load(events)
+    population.rebuild_calendar()
+
+    # Генератор того же типа и ровно в том же состоянии
+    bit_generator = getattr(np.random, meta['rng']['bit_generator'])()
+    bit_generator.state = meta['rng']
+    population.rng = np.random.Generator(bit_generator)
+    return population
+
+
+def run_with_checkpoints(population, steps, path, every=100):
+    """Population.run, но каждые every шагов состояние сохраняется в path"""
+    population.history.reserve(steps)
+    for step in range(1, steps + 1):
+        population.step()
+        if step % every == 0:
+            save_checkpoint(population, path)
+    return population
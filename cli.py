@@ -0,0 +1,260 @@
+# Запуск симуляции из командной строки по файлу сценария (TOML или JSON)
+#
+#   python cli.py run scenarios/main.toml --steps 900 --seed 1 --output result.json
+#   python cli.py run scenarios/main.toml --set infection_rate=0.5 --set quarantine_enabled=true
+#   python cli.py render scenarios/main.toml                  # окно, как main.py
+#   python cli.py render scenarios/main.toml --output run.mp4  # видео без окна
+#   python cli.py bench --sizes 1e3 1e4 --engines grid
+#
+# Сценарий - это таблицы [population] (аргументы Population), [run] (steps, seed,
+# on_extinction) и [render] (параметры окна и экспорта видео). Для run, который
+# пишет только числа в JSON, matplotlib не импортируется вообще, чтобы запуск
+# занимал доли секунды и тысячи коротких задач из планировщика не ждали графику.
+
+import argparse
+import inspect
+import json
+import sys
+import time
+from population import Population, EXTINCTION_MODES
+
+# Что можно задавать в сценарии в каждой таблице
+POPULATION_KEYS = tuple(name for name in inspect.signature(Population.__init__).parameters
+                        if name not in ('self', 'rng', 'verbose', 'stats'))
+RUN_KEYS = ('steps', 'seed', 'on_extinction')
+RENDER_KEYS = ('interval', 'output', 'stride', 'resolution', 'dpi', 'fps', 'workers', 'live',
+               'target_fps', 'max_agents_drawn')
+SECTIONS = {'population': POPULATION_KEYS, 'run': RUN_KEYS, 'render': RENDER_KEYS}
+
+DEFAULT_STEPS = 900
+
+
+class ScenarioError(ValueError):
+    """Ошибка в файле сценария или в переопределениях --set"""
+
+
+def load_scenario(path):
+    """Читает сценарий из .toml или .json, возвращает словарь таблиц SECTIONS"""
+    if path is None:
+        scenario = {}
+    elif path.endswith('.json'):
+        with open(path, 'r', encoding='utf-8') as f:
+            try:
+                scenario = json.load(f)
+            except json.JSONDecodeError as e:
+                raise ScenarioError(f"{path}: некорректный JSON: {e}") from e
+    else:
+        try:
+            import tomllib
+        except ImportError:  # Python < 3.11
+            try:
+                import tomli as tomllib
+            except ImportError:
+                raise ScenarioError("Для TOML нужен Python 3.11+ или пакет tomli (или используйте .json)")
+        with open(path, 'rb') as f:
+            try:
+                scenario = tomllib.load(f)
+            except (tomllib.TOMLDecodeError, UnicodeDecodeError) as e:
+                raise ScenarioError(f"{path}: некорректный TOML: {e}") from e
+
+    if not isinstance(scenario, dict):
+        raise ScenarioError("Сценарий должен быть таблицей (объектом) с разделами population, run, render")
+    unknown = set(scenario) - set(SECTIONS)
+    if unknown:
+        raise ScenarioError(f"Неизвестные таблицы: {', '.join(sorted(unknown))}")
+    for section, keys in SECTIONS.items():
+        scenario.setdefault(section, {})
+        if not isinstance(scenario[section], dict):
+            raise ScenarioError(f"[{section}] должен быть таблицей")
+        unknown = set(scenario[section]) - set(keys)
+        if unknown:
+            raise ScenarioError(f"Неизвестные ключи в [{section}]: {', '.join(sorted(unknown))}")
+    return scenario
+
+
+def apply_overrides(scenario, overrides):
+    """--set key=value: значение читается как JSON (числа, true/false), иначе как строка"""
+    for item in overrides or ():
+        key, sep, value = item.partition('=')
+        if not sep:
+            raise ScenarioError(f"--set ждет key=value, получено: {item}")
+        if key not in POPULATION_KEYS:
+            raise ScenarioError(f"Неизвестный параметр Population: {key}")
+        try:
+            scenario['population'][key] = json.loads(value)
+        except json.JSONDecodeError:
+            scenario['population'][key] = value
+    return scenario
+
+
+def _prepare(args):
+    scenario = apply_overrides(load_scenario(args.scenario), args.set)
+    run = scenario['run']
+    if args.steps is not None:
+        run['steps'] = args.steps
+    if args.seed is not None:
+        run['seed'] = args.seed
+    run.setdefault('steps', DEFAULT_STEPS)
+    run.setdefault('seed', None)
+    _check_run(run)
+    return scenario
+
+
+def _check_run(run):
+    """Проверяет таблицу [run] до запуска, чтобы опечатка давала ошибку сценария"""
+    steps = run['steps']
+    if isinstance(steps, bool) or not isinstance(steps, int) or steps < 0:
+        raise ScenarioError(f"[run] steps должно быть целым числом >= 0, получено: {steps!r}")
+    on_extinction = run.get('on_extinction')
+    if on_extinction not in EXTINCTION_MODES:
+        modes = ', '.join(repr(mode) for mode in EXTINCTION_MODES if mode is not None)
+        raise ScenarioError(f"[run] on_extinction должно быть одним из {modes}, получено: {on_extinction!r}")
+
+
+def _build_population(scenario, **options):
+    """Population по таблице [population]; недопустимые значения - ошибка сценария"""
+    try:
+        return Population(**scenario['population'], **options)
+    except (ValueError, TypeError) as e:
+        raise ScenarioError(f"Недопустимые параметры [population]: {e}") from e
+
+
+def _write_json(result, path):
+    text = json.dumps(result, ensure_ascii=False)
+    if path is None:
+        sys.stdout.write(text + '\n')
+        return
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(text + '\n')
+
+
+def cmd_run(args):
+    """Прогон без графики, результат в JSON"""
+    from sweep import run_metrics
+
+    scenario = _prepare(args)
+    run = scenario['run']
+    start = time.perf_counter()
+    population = _build_population(scenario, rng=run['seed'], verbose=False)
+    population.run(run['steps'], on_extinction=run.get('on_extinction'))
+    elapsed = time.perf_counter() - start
+
+    result = {
+        'scenario': args.scenario,
+        'params': scenario['population'],
+        'seed': run['seed'],
+        'steps': run['steps'],
+        'time': population.time,
+        'metrics': run_metrics(population),
+        'final': dict(zip(('susceptible', 'infected', 'recovered', 'vaccinated'),
+                          (int(c) for c in population.counts))),
+        'elapsed_sec': elapsed,
+    }
+    if args.history:
+        result['history'] = population.history.data.tolist()
+    _write_json(result, args.output)
+
+
+def cmd_render(args):
+    """Окно с анимацией, живой режим или видео (matplotlib импортируется только здесь)"""
+    from visualization import SimulationVisualizer
+
+    scenario = _prepare(args)
+    run, render = scenario['run'], scenario['render']
+    for key in ('output', 'stride', 'fps', 'dpi', 'workers'):
+        if getattr(args, key) is not None:
+            render[key] = getattr(args, key)
+    if args.resolution is not None:
+        render['resolution'] = args.resolution
+    if args.live:
+        render['live'] = True
+
+    population = _build_population(scenario, rng=run['seed'], verbose=not render.get('output'))
+    visualizer = SimulationVisualizer(population, frames=run['steps'], interval=render.get('interval', 20))
+    if render.get('output'):
+        options = {key: render[key] for key in ('stride', 'fps', 'dpi', 'workers', 'max_agents_drawn')
+                   if key in render}
+        if 'resolution' in render:
+            options['resolution'] = tuple(render['resolution'])
+        frames = visualizer.export(render['output'], **options)
+        print(f"{render['output']}: {frames} кадров", file=sys.stderr)
+        return
+    if render.get('live'):
+        visualizer.run_live(target_fps=render.get('target_fps', 30), steps=run['steps'],
+                            max_agents_drawn=render.get('max_agents_drawn'))
+    else:
+        visualizer.run()
+    # Без окна (неинтерактивный backend) анимация не запускается и рисовать нечего
+    if population.time > 0:
+        visualizer.show_final_results()
+
+
+def cmd_bench(args):
+    """Бенчмарк движков (аргументы передаются в bench.py как есть)"""
+    import bench
+    bench_args = args.bench_args
+    if bench_args and bench_args[0] == '--':
+        bench_args = bench_args[1:]
+    bench.main(bench_args)
+
+
+def _resolution(value):
+    try:
+        width, height = (int(v) for v in value.lower().split('x'))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Разрешение в виде ШИРИНАxВЫСОТА, получено: {value}")
+    return width, height
+
+
+def _add_scenario_args(parser):
+    parser.add_argument('scenario', nargs='?', help="файл сценария .toml или .json (без него - параметры по умолчанию)")
+    parser.add_argument('--steps', type=int, help=f"число шагов (по умолчанию из сценария или {DEFAULT_STEPS})")
+    parser.add_argument('--seed', type=int)
+    parser.add_argument('--set', action='append', metavar='KEY=VALUE', help="переопределить параметр Population")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Симуляция распространения вируса")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run = commands.add_parser('run', help="прогон без графики, результат в JSON")
+    _add_scenario_args(run)
+    run.add_argument('--output', help="файл для JSON (по умолчанию stdout)")
+    run.add_argument('--history', action='store_true', help="добавить в JSON историю S/I/R/V по шагам")
+    run.set_defaults(handler=cmd_run)
+
+    render = commands.add_parser('render', help="анимация в окне или экспорт в видео")
+    _add_scenario_args(render)
+    render.add_argument('--output', help="сохранить в .mp4/.gif вместо окна")
+    render.add_argument('--live', action='store_true', help="живой режим (модель в отдельном потоке)")
+    render.add_argument('--stride', type=int)
+    render.add_argument('--fps', type=int)
+    render.add_argument('--dpi', type=int)
+    render.add_argument('--resolution', type=_resolution, help="например 1280x512")
+    render.add_argument('--workers', type=int)
+    render.set_defaults(handler=cmd_render)
+
+    # Все флаги bench (и --help тоже) уходят в bench.py как есть
+    bench = commands.add_parser('bench', add_help=False, help="бенчмарк движков (см. python bench.py --help)")
+    bench.set_defaults(handler=cmd_bench)
+
+    args, extra = parser.parse_known_args(argv)
+    if args.command != 'bench' and extra:
+        parser.error(f"unrecognized arguments: {' '.join(extra)}")
+    args.bench_args = extra
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    try:
+        args.handler(args)
+    except (ScenarioError, OSError) as e:
+        # Ошибки сценария коротко, все остальное - с полным traceback
+        print(f"Ошибка: {e}", file=sys.stderr)
+        return 2
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
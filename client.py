@@ -0,0 +1,91 @@
+# Простой клиент для server.py: подключается по TCP и собирает кадры обратно
+# в массивы numpy (статусы восстанавливаются из ключевых кадров и дельт).
+#
+#   python client.py --port 8765
+
+import argparse
+import asyncio
+from collections import namedtuple
+import numpy as np
+from server import FRAME_HEADER, KEYFRAME, FLAG_QUARANTINE, POSITION_FORMATS, _LENGTH
+
+Frame = namedtuple('Frame', 'time positions status counts quarantine_active keyframe')
+
+_POSITION_DTYPES = {POSITION_FORMATS['float32']: np.float32, POSITION_FORMATS['uint16']: np.uint16}
+
+
+def decode_frame(payload, status=None):
+    """Разбирает кадр сервера.
+
+    status - статусы после предыдущего кадра (для дельты); возвращается Frame
+    с новым массивом статусов. Координаты всегда float32 в [0, 1].
+    """
+    kind, position_format, flags, time, size, *counts = FRAME_HEADER.unpack_from(payload)
+    offset = FRAME_HEADER.size
+    dtype = _POSITION_DTYPES[position_format]
+    positions = np.frombuffer(payload, dtype=dtype, count=2 * size, offset=offset).reshape(size, 2)
+    offset += positions.nbytes
+    if dtype == np.uint16:
+        positions = positions.astype(np.float32) / 65535
+    if kind == KEYFRAME:
+        status = np.frombuffer(payload, dtype=np.int8, count=size, offset=offset).copy()
+    else:
+        if status is None:
+            raise ValueError("Дельта пришла раньше ключевого кадра")
+        changes, = _LENGTH.unpack_from(payload, offset)
+        offset += _LENGTH.size
+        agents = np.frombuffer(payload, dtype=np.uint32, count=changes, offset=offset)
+        values = np.frombuffer(payload, dtype=np.int8, count=changes, offset=offset + 4 * changes)
+        status = status.copy()
+        status[agents] = values
+    return Frame(time, positions, status, np.array(counts), bool(flags & FLAG_QUARANTINE), kind == KEYFRAME)
+
+
+class StreamClient:
+    """Подписка на трансляцию: async for frame in StreamClient(host, port)"""
+
+    def __init__(self, host='127.0.0.1', port=8765):
+        self.host = host
+        self.port = port
+        self.frames = 0
+        self.keyframes = 0
+
+    async def __aiter__(self):
+        reader, writer = await asyncio.open_connection(self.host, self.port)
+        status = None
+        try:
+            while True:
+                try:
+                    header = await reader.readexactly(_LENGTH.size)
+                except asyncio.IncompleteReadError:
+                    return  # сервер закончил трансляцию
+                length, = _LENGTH.unpack(header)
+                frame = decode_frame(await reader.readexactly(length), status)
+                status = frame.status
+                self.frames += 1
+                self.keyframes += frame.keyframe
+                yield frame
+        finally:
+            writer.close()
+
+
+async def _print_stream(host, port):
+    async for frame in StreamClient(host, port):
+        s, i, r, v = frame.counts
+        quarantine = ' [КАРАНТИН]' if frame.quarantine_active else ''
+        print(f"День {frame.time}: S={s} I={i} R={r} V={v}{quarantine}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Клиент трансляции симуляции")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    args = parser.parse_args(argv)
+    try:
+        asyncio.run(_print_stream(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
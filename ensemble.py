@@ -0,0 +1,63 @@
+# Монте-Карло ансамбль: много прогонов одной и той же модели с разными seed
+# Работает без matplotlib, прогоны раскидываются по процессам
+
+import os
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from population import Population
+
+
+class EnsembleResult:
+    """Результат ансамбля: кривые S/I/R/V всех реплик и сводка по ним"""
+
+    def __init__(self, curves, quantile_levels):
+        # curves: (реплики, шаги, 4) - столбцы S, I, R, V
+        self.curves = curves
+        self.mean = curves.mean(axis=0)
+        self.quantile_levels = tuple(quantile_levels)
+        # quantiles: (число квантилей, шаги, 4)
+        self.quantiles = np.quantile(curves, self.quantile_levels, axis=0)
+
+    @property
+    def replicas(self):
+        return self.curves.shape[0]
+
+    @property
+    def steps(self):
+        return self.curves.shape[1]
+
+    def band(self, level):
+        """Кривая для одного из посчитанных квантилей"""
+        return self.quantiles[self.quantile_levels.index(level)]
+
+
+def run_replica(params, steps, seed):
+    """Один прогон без графики. seed - SeedSequence (или число) этой реплики"""
+    population = Population(**params, rng=np.random.default_rng(seed), verbose=False)
+    population.run(steps)
+    return population.history.data.copy()
+
+
+def _run_replica_args(args):
+    return run_replica(*args)
+
+
+def run_ensemble(params, replicas=100, steps=900, seed=0, workers=None,
+                 quantiles=(0.05, 0.5, 0.95)):
+    """Запускает replicas прогонов с параметрами params (аргументы Population).
+
+    У каждой реплики свой поток случайных чисел из SeedSequence(seed).spawn,
+    поэтому результат не зависит от числа процессов и порядка их выполнения.
+    workers=1 - считать в текущем процессе без пула.
+    """
+    seeds = np.random.SeedSequence(seed).spawn(replicas)
+    tasks = [(params, steps, s) for s in seeds]
+
+    if workers == 1:
+        curves = [_run_replica_args(task) for task in tasks]
+    else:
+        chunksize = max(1, replicas // (4 * (workers or os.cpu_count() or 1)))
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            curves = list(pool.map(_run_replica_args, tasks, chunksize=chunksize))
+
+    return EnsembleResult(np.stack(curves), quantiles)
@@ -0,0 +1,162 @@
+# Журнал событий эпидемии: кто кого заразил и когда менялись меры
+# События пишутся столбцами в заранее выделенные массивы, которые растут
+# (вдвое, кусками по chunk строк), так что шаг симуляции добавляет сразу все заражения
+# шага одной записью в срезы, без питоновских объектов на каждое событие.
+# Поверх журнала считаются R_t, интервалы между поколениями и распределение
+# числа вторичных случаев - векторно, за один проход по всем событиям.
+
+import numpy as np
+
+# Столбцы журнала заражений: шаг, кто заразился, от кого (-1 - начальные
+# зараженные), где это случилось
+INFECTION_COLUMNS = (('step', np.int32), ('infectee', np.int32), ('infector', np.int32),
+                     ('x', np.float32), ('y', np.float32))
+# Столбцы журнала мер: шаг, вид меры (номер в POLICY_KINDS), доля зараженных в этот момент
+POLICY_COLUMNS = (('step', np.int32), ('kind', np.int8), ('value', np.float32))
+POLICY_KINDS = ('quarantine_start', 'quarantine_end', 'vaccination_start')
+
+
+class ColumnTable:
+    """Таблица из нескольких столбцов numpy, строки добавляются пачками"""
+
+    def __init__(self, columns, chunk=4096):
+        self.columns = tuple(name for name, _ in columns)
+        self.chunk = chunk
+        self.total = 0
+        self._data = {name: np.zeros(chunk, dtype=dtype) for name, dtype in columns}
+
+    def __len__(self):
+        return self.total
+
+    def reserve(self, rows):
+        if self.total + rows > len(self._data[self.columns[0]]):
+            # Растем хотя бы вдвое, чтобы копирований было O(log n)
+            capacity = max(self.total + rows, 2 * len(self._data[self.columns[0]]))
+            capacity = -(-capacity // self.chunk) * self.chunk
+            for name, column in self._data.items():
+                grown = np.zeros(capacity, dtype=column.dtype)
+                grown[:self.total] = column[:self.total]
+                self._data[name] = grown
+
+    def append(self, count, **values):
+        """Дописывает count строк; значение столбца - массив или одно число на все строки"""
+        if count == 0:
+            return
+        self.reserve(count)
+        for name in self.columns:
+            self._data[name][self.total:self.total + count] = values[name]
+        self.total += count
+
+    def __getitem__(self, name):
+        """Столбец целиком (вид только для чтения)"""
+        view = self._data[name][:self.total].view()
+        view.flags.writeable = False
+        return view
+
+    def load(self, columns):
+        """Заменяет содержимое (например, при загрузке чекпойнта)"""
+        count = len(columns[self.columns[0]])
+        self.total = 0
+        self.reserve(count)
+        for name in self.columns:
+            self._data[name][:count] = columns[name]
+        self.total = count
+
+
+class EventLog:
+    """Журнал заражений и мер для одной популяции"""
+
+    def __init__(self, chunk=4096):
+        self.infections = ColumnTable(INFECTION_COLUMNS, chunk)
+        self.policy = ColumnTable(POLICY_COLUMNS, 64)
+
+    def __len__(self):
+        return len(self.infections)
+
+    def record_infections(self, step, infectees, infectors, positions):
+        """Заражения одного шага: массивы агентов, заразивших их агентов и координат"""
+        self.infections.append(len(infectees), step=step, infectee=infectees, infector=infectors,
+                               x=positions[:, 0], y=positions[:, 1])
+
+    def record_policy(self, step, kind, value=np.nan):
+        self.policy.append(1, step=step, kind=POLICY_KINDS.index(kind), value=value)
+
+    def policy_steps(self, kind):
+        """Шаги, на которых случалась мера kind (например, 'quarantine_start')"""
+        return self.policy['step'][self.policy['kind'] == POLICY_KINDS.index(kind)]
+
+    def parents(self):
+        """Для каждого заражения - номер заражения-источника в журнале (-1, если его нет).
+
+        Агент может болеть несколько раз, поэтому источником считается последнее
+        заражение заразившего агента до шага текущего. Все ищется одним
+        searchsorted по заражениям, отсортированным по (агент, шаг).
+        """
+        steps = self.infections['step'].astype(np.int64)
+        infectee = self.infections['infectee'].astype(np.int64)
+        infector = self.infections['infector'].astype(np.int64)
+        parents = np.full(len(steps), -1, dtype=np.int64)
+        if len(steps) == 0:
+            return parents
+
+        span = int(steps.max()) + 2
+        keys = infectee * span + steps
+        order = np.argsort(keys, kind='stable')
+        sorted_keys = keys[order]
+
+        known = np.flatnonzero(infector >= 0)
+        # Последнее заражение агента infector строго раньше шага заражения.
+        # Запросы тоже сортируем: searchsorted по отсортированным запросам идет
+        # по памяти подряд и на миллионах событий в разы быстрее
+        queries = infector[known] * span + steps[known]
+        query_order = np.argsort(queries)
+        found = np.empty(len(queries), dtype=np.int64)
+        found[query_order] = np.searchsorted(sorted_keys, queries[query_order], side='left') - 1
+        valid = found >= 0
+        valid[valid] = sorted_keys[found[valid]] // span == infector[known[valid]]
+        parents[known[valid]] = order[found[valid]]
+        return parents
+
+    def secondary_cases(self, parents=None):
+        """Сколько человек заразил каждый заболевший (по заражениям журнала)"""
+        if parents is None:
+            parents = self.parents()
+        return np.bincount(parents[parents >= 0], minlength=len(parents))
+
+    def secondary_case_distribution(self, parents=None):
+        """Гистограмма: сколько заболевших заразили 0, 1, 2, ... человек"""
+        return np.bincount(self.secondary_cases(parents))
+
+    def generation_intervals(self, parents=None):
+        """Шагов между заражением источника и заражением от него"""
+        if parents is None:
+            parents = self.parents()
+        steps = self.infections['step']
+        child = np.flatnonzero(parents >= 0)
+        return steps[child] - steps[parents[child]]
+
+    def reproduction_number(self, steps=None, parents=None):
+        """Эффективное R_t по шагам: среднее число вторичных случаев у заразившихся на шаге t.
+
+        Возвращает массив длины steps (по умолчанию до последнего шага журнала),
+        NaN там, где никто не заразился. Для последних шагов значения занижены:
+        недавно заболевшие еще не успели заразить всех, кого заразят.
+        """
+        day = self.infections['step']
+        if steps is None:
+            steps = int(day.max()) + 1 if len(day) else 0
+        secondary = self.secondary_cases(parents)
+        cases = np.bincount(day, minlength=steps)[:steps]
+        offspring = np.bincount(day, weights=secondary, minlength=steps)[:steps]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.where(cases > 0, offspring / cases, np.nan)
+
+    def state(self):
+        """Столбцы журнала для сохранения (имена с префиксами infection_ и policy_)"""
+        arrays = {f'infection_{name}': self.infections[name] for name in self.infections.columns}
+        arrays.update({f'policy_{name}': self.policy[name] for name in self.policy.columns})
+        return arrays
+
+    def load(self, arrays):
+        self.infections.load({name: arrays[f'infection_{name}'] for name in self.infections.columns})
+        self.policy.load({name: arrays[f'policy_{name}'] for name in self.policy.columns})
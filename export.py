@@ -0,0 +1,205 @@
+# Экспорт симуляции в видео (MP4) или GIF без окна
+# Сначала модель прогоняется без графики и пишется в файл траекторий (recorder.py),
+# потом кадры рисуются параллельно в пуле процессов: каждый процесс открывает
+# запись через memmap и рисует свои кадры в той же раскладке, что и окно
+# визуализатора. Готовые кадры по порядку уходят в ffmpeg через pipe, так что
+# в памяти держится только небольшое окно кадров, а не все видео.
+
+import os
+import shutil
+import subprocess
+import tempfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import matplotlib
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from recorder import TrajectoryReader, ReplayPopulation, record_run
+
+# Состояние процесса-рисовальщика (заполняется в _init_worker)
+_renderer = None
+
+
+class _FrameRenderer:
+    """Рисует произвольный кадр записи на фигуре SimulationVisualizer"""
+
+    def __init__(self, recording, resolution, dpi, max_agents_drawn, seed):
+        from visualization import SimulationVisualizer
+
+        self.reader = TrajectoryReader(recording)
+        # Фигура со своим Agg-холстом, мимо pyplot: backend вызывающего процесса
+        # не трогаем, и его окна после экспорта работают как раньше
+        self.fig = Figure(figsize=(15, 6))
+        FigureCanvasAgg(self.fig)
+        population = ReplayPopulation(self.reader)
+        self.census = population.census
+        self.visualizer = SimulationVisualizer(population, frames=len(self.reader), figure=self.fig)
+
+        width, height = resolution
+        self.fig.set_dpi(dpi)
+        self.fig.set_size_inches(width / dpi, height / dpi)
+        self.fig.tight_layout()
+        self.visualizer.init_animation()
+
+        # Как и в живом режиме, на больших популяциях рисуем фиксированную выборку агентов
+        size = self.reader.size
+        self.agents = None
+        if max_agents_drawn is not None and max_agents_drawn < size:
+            rng = np.random.default_rng(seed)
+            self.agents = np.sort(rng.choice(size, max_agents_drawn, replace=False))
+
+    def render(self, frame):
+        """Кадр frame как байты RGB (height, width, 3)"""
+        v = self.visualizer
+        reader = self.reader
+        v.scatter.set_offsets(reader.positions(frame, frame + 1, self.agents)[0])
+        v.scatter.set_array(reader.status(frame, frame + 1, self.agents)[0])
+
+        t = np.arange(frame + 1)
+        counts = self.census[:frame + 1]
+        v.line_susceptible.set_data(t, counts[:, 0])
+        v.line_infected.set_data(t, counts[:, 1])
+        v.line_recovered.set_data(t, counts[:, 2])
+        v.line_vaccinated.set_data(t, counts[:, 3])
+
+        quarantine_active = bool(reader.quarantine(frame, frame + 1)[0])
+        v.stats_text.set_text(v._stats_text(reader.start_time + frame + 1, counts[-1], quarantine_active))
+
+        self.fig.canvas.draw()
+        return np.asarray(self.fig.canvas.buffer_rgba())[:, :, :3].tobytes()
+
+    def frame_size(self):
+        self.fig.canvas.draw()
+        return self.fig.canvas.get_width_height()
+
+    def close(self):
+        self.fig.clear()
+
+
+def _init_worker(recording, resolution, dpi, max_agents_drawn, seed):
+    global _renderer
+    _renderer = _FrameRenderer(recording, resolution, dpi, max_agents_drawn, seed)
+
+
+def _close_renderer():
+    global _renderer
+    if _renderer is not None:
+        _renderer.close()
+        _renderer = None
+
+
+def _render_frames(frames):
+    return [_renderer.render(frame) for frame in frames]
+
+
+def _frame_size():
+    return _renderer.frame_size()
+
+
+def _encoder_command(path, width, height, fps):
+    """Команда ffmpeg: сырые RGB-кадры из stdin в MP4 или GIF"""
+    ffmpeg = shutil.which(matplotlib.rcParams['animation.ffmpeg_path'])
+    if ffmpeg is None:
+        raise RuntimeError("Для экспорта нужен ffmpeg: установите его или укажите путь "
+                           "в matplotlib.rcParams['animation.ffmpeg_path']")
+    command = [ffmpeg, '-y', '-loglevel', 'error',
+               '-f', 'rawvideo', '-pix_fmt', 'rgb24', '-s', f'{width}x{height}', '-r', str(fps),
+               '-i', '-', '-an']
+    if os.path.splitext(path)[1].lower() == '.gif':
+        # Палитра считается по всем кадрам внутри ffmpeg, иначе цвета GIF плывут
+        command += ['-vf', 'split[a][b];[a]palettegen[p];[b][p]paletteuse']
+    else:
+        command += ['-vcodec', 'libx264', '-pix_fmt', 'yuv420p']
+    return command + [path]
+
+
+def export_recording(recording, path, stride=1, resolution=(1500, 600), dpi=100, fps=30,
+                     workers=None, chunk=8, max_agents_drawn=None, seed=0):
+    """Рисует записанные траектории recording в видео path (.mp4 или .gif).
+
+    stride - рисовать каждый stride-й шаг (последний шаг попадает всегда),
+    resolution - размер кадра в пикселях (ширина, высота), dpi - плотность
+    (от нее зависят размеры шрифтов и точек относительно кадра).
+    Кадры рисуются кусками по chunk штук в workers процессах (workers=1 - в
+    текущем процессе). Возвращает число записанных кадров.
+    """
+    width, height = resolution
+    if not path.lower().endswith('.gif'):
+        # yuv420p требует четных размеров кадра
+        width, height = width - width % 2, height - height % 2
+    resolution = (width, height)
+
+    total = len(TrajectoryReader(recording))
+    frames = list(range(0, total, stride))
+    if frames and frames[-1] != total - 1:
+        frames.append(total - 1)
+    chunks = [frames[i:i + chunk] for i in range(0, len(frames), chunk)]
+    init_args = (recording, resolution, dpi, max_agents_drawn, seed)
+
+    encoder = None
+    pool = None
+    try:
+        if workers == 1:
+            _init_worker(*init_args)
+            real_size = _renderer.frame_size()
+        else:
+            workers = workers or os.cpu_count() or 1
+            pool = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=init_args)
+            # Размер после отрисовки может отличаться от заказанного на пиксель из-за округления
+            real_size = pool.submit(_frame_size).result()
+
+        encoder = subprocess.Popen(_encoder_command(path, *real_size, fps), stdin=subprocess.PIPE)
+
+        if pool is None:
+            for frames_chunk in chunks:
+                for data in _render_frames(frames_chunk):
+                    encoder.stdin.write(data)
+        else:
+            # Держим в работе не больше двух кусков на процесс, иначе при медленном
+            # кодировщике готовые кадры копились бы в памяти
+            pending = deque()
+            todo = iter(chunks)
+            for frames_chunk in todo:
+                pending.append(pool.submit(_render_frames, frames_chunk))
+                if len(pending) >= 2 * workers:
+                    break
+            while pending:
+                for data in pending.popleft().result():
+                    encoder.stdin.write(data)
+                next_chunk = next(todo, None)
+                if next_chunk is not None:
+                    pending.append(pool.submit(_render_frames, next_chunk))
+
+        encoder.stdin.close()
+        if encoder.wait() != 0:
+            raise RuntimeError(f"ffmpeg завершился с кодом {encoder.returncode}")
+        encoder = None
+    finally:
+        if encoder is not None:
+            encoder.kill()
+            encoder.wait()
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+        else:
+            _close_renderer()
+    return len(frames)
+
+
+def export_video(population, steps, path, trajectory=None, **options):
+    """Прогоняет population на steps шагов без графики и сохраняет видео path.
+
+    Траектории пишутся во временный файл рядом с path (или в trajectory, тогда
+    файл остается и его можно переиспользовать). options - параметры
+    export_recording (stride, resolution, dpi, fps, workers, ...).
+    """
+    keep = trajectory is not None
+    if not keep:
+        fd, trajectory = tempfile.mkstemp(suffix='.traj', dir=os.path.dirname(os.path.abspath(path)))
+        os.close(fd)
+    try:
+        record_run(population, steps, trajectory)
+        return export_recording(trajectory, path, **options)
+    finally:
+        if not keep:
+            os.remove(trajectory)
@@ -0,0 +1,114 @@
+# Компактное хранение истории для графиков
+# Вместо четырех питоновских списков - один заранее выделенный массив int32
+# (шаги x 4), который растет кусками. Есть режим кольцевого буфера фиксированного
+# размера для очень длинных или бесконечных прогонов.
+
+import numpy as np
+
+
+class History:
+    """Построчная история: одна строка формы row_shape на каждый шаг"""
+
+    def __init__(self, row_shape=(4,), chunk=1024, maxlen=None, dtype=np.int32):
+        self.row_shape = tuple(row_shape)
+        self.chunk = chunk
+        self.maxlen = maxlen
+        self.dtype = dtype
+        # Сколько строк записано за все время (в кольцевом режиме больше, чем хранится)
+        self.total = 0
+
+        if maxlen is None:
+            self._buffer = np.zeros((chunk,) + self.row_shape, dtype=dtype)
+        else:
+            # Каждая строка пишется дважды (в i и i + maxlen), поэтому последние
+            # maxlen строк всегда лежат подряд и отдаются без копирования
+            self._buffer = np.zeros((2 * maxlen,) + self.row_shape, dtype=dtype)
+
+    def __len__(self):
+        if self.maxlen is None:
+            return self.total
+        return min(self.total, self.maxlen)
+
+    def reserve(self, rows):
+        """Заранее выделяет место еще под rows строк (если известна длина прогона)"""
+        if self.maxlen is None and self.total + rows > len(self._buffer):
+            self._grow(self.total + rows)
+
+    def _grow(self, capacity):
+        capacity = -(-capacity // self.chunk) * self.chunk  # округляем вверх до куска
+        buffer = np.zeros((capacity,) + self.row_shape, dtype=self.dtype)
+        buffer[:self.total] = self._buffer[:self.total]
+        self._buffer = buffer
+
+    def append(self, row):
+        if self.maxlen is None:
+            if self.total == len(self._buffer):
+                self._grow(self.total + self.chunk)
+            self._buffer[self.total] = row
+        else:
+            i = self.total % self.maxlen
+            self._buffer[i] = row
+            self._buffer[i + self.maxlen] = row
+        self.total += 1
+
+    def extend(self, rows):
+        """Дописывает сразу много строк (без цикла по ним)"""
+        rows = np.asarray(rows, dtype=self.dtype).reshape((-1,) + self.row_shape)
+        if self.maxlen is None:
+            self.reserve(len(rows))
+            self._buffer[self.total:self.total + len(rows)] = rows
+            self.total += len(rows)
+            return
+        total = self.total + len(rows)
+        rows = rows[-self.maxlen:]
+        positions = np.arange(total - len(rows), total) % self.maxlen
+        self._buffer[positions] = rows
+        self._buffer[positions + self.maxlen] = rows
+        self.total = total
+
+    def load(self, rows, total=None):
+        """Заменяет содержимое на rows (например, при восстановлении из чекпойнта).
+
+        total - сколько строк было записано всего (для кольцевого буфера он
+        может быть больше len(rows)).
+        """
+        rows = np.asarray(rows, dtype=self.dtype).reshape((-1,) + self.row_shape)
+        total = len(rows) if total is None else total
+        if self.maxlen is None:
+            self._buffer = np.zeros((0,) + self.row_shape, dtype=self.dtype)
+            self.total = 0
+            self._grow(len(rows) + self.chunk)
+            self._buffer[:len(rows)] = rows
+        else:
+            rows = rows[-self.maxlen:]
+            self._buffer[:] = 0
+            # Кладем строки туда, где они оказались бы при обычной записи
+            positions = np.arange(total - len(rows), total) % self.maxlen
+            self._buffer[positions] = rows
+            self._buffer[positions + self.maxlen] = rows
+        self.total = total
+
+    @property
+    def data(self):
+        """Все хранимые строки по порядку (вид только для чтения)"""
+        if self.maxlen is None:
+            view = self._buffer[:self.total]
+        else:
+            n = len(self)
+            start = self.total % self.maxlen if self.total > self.maxlen else 0
+            view = self._buffer[start:start + n]
+        view = view.view()
+        view.flags.writeable = False
+        return view
+
+    @property
+    def steps(self):
+        """Номера шагов для хранимых строк (с нуля, как range(len) у списков)"""
+        return np.arange(self.total - len(self), self.total)
+
+    def column(self, index):
+        """Один столбец истории, например число инфицированных"""
+        return self.data[..., index]
+
+    def last(self):
+        return self.data[-1]
@@ -49,7 +49,8 @@ try:
         quarantine_threshold=QUARANTINE_THRESHOLD,
         vaccination_enabled=VACCINATION_ENABLED,
         vaccination_start=VACCINATION_START,
-        vaccination_rate=VACCINATION_RATE
+        vaccination_rate=VACCINATION_RATE,
+        events=True  # журнал заражений и мер (для итогового графика)
     )
     
     # Создаем визуализатор
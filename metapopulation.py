@@ -0,0 +1,314 @@
+# Метапопуляция: много регионов (городов) со своими параметрами, связанных миграцией
+# Все агенты всех регионов лежат в одних плоских массивах, у каждого агента есть
+# номер региона. Координаты у всех в своем единичном квадрате, а сетка клеток
+# разделяет регионы через группы (как реплики в batch.py), так что контакты бывают
+# только внутри региона. Переезд агента в другой регион - это просто новый номер
+# региона в его строке: сами строки (координаты, скорости, таймеры) никуда не
+# копируются, и миграция не выделяет памяти под агентов.
+#
+# Карантин и вакцинация у каждого региона свои. История хранится по регионам
+# (строка (K, 4) на шаг), общая по всем регионам - их сумма.
+
+import inspect
+import numpy as np
+from population import (Population, Status, QUADRANT_OFFSETS, DTYPES, QUARANTINE_SLOWDOWN,
+                        quarantine_switch)
+from spatial import CellGrid
+from history import History
+
+# Параметры Population, которые могут быть разными у разных регионов
+REGION_PARAMS = ('size', 'initial_infected', 'infection_rate', 'recovery_time', 'immunity_time',
+                 'movement_speed', 'quarantine_enabled', 'quarantine_threshold',
+                 'vaccination_enabled', 'vaccination_start', 'vaccination_rate')
+_DEFAULTS = {name: param.default for name, param in inspect.signature(Population.__init__).parameters.items()
+             if name in REGION_PARAMS}
+
+
+class Metapopulation:
+    """K регионов, которые считаются вместе одними операциями numpy.
+
+    regions - список словарей с аргументами Population для каждого региона
+    (чего нет, берется по умолчанию, см. REGION_PARAMS). Радиус контакта общий
+    для всех регионов, потому что сетка клеток одна.
+
+    migration - разреженная матрица переездов в виде трех массивов
+    (откуда, куда, вероятность): за шаг каждый агент региона src переезжает в
+    dst с вероятностью rate. Сумма вероятностей из одного региона не больше 1.
+    """
+
+    def __init__(self, regions, migration=None, interaction_radius=0.03, rng=None, history_size=None):
+        self.rng = np.random.default_rng(rng)
+        self.regions = len(regions)
+        self.interaction_radius = interaction_radius
+        self.grid = CellGrid(interaction_radius)
+        K = self.regions
+
+        # Параметры регионов - массивы длины K
+        for name in REGION_PARAMS:
+            setattr(self, name, np.array([region.get(name, _DEFAULTS[name]) for region in regions]))
+        self.quarantine_enabled = self.quarantine_enabled.astype(bool)
+        self.vaccination_enabled = self.vaccination_enabled.astype(bool)
+        self.quarantine_threshold = self.quarantine_threshold / 100
+        self.infection_rate = self.infection_rate.astype(np.float64)
+
+        # Агентов может быть десятки миллионов, поэтому типы всегда компактные
+        dtypes = DTYPES[True]
+        if max(self.recovery_time.max(), self.immunity_time.max()) > np.iinfo(dtypes['timers']).max:
+            raise ValueError("recovery_time и immunity_time не помещаются в int16")
+
+        sizes = self.size.astype(np.int64)
+        total = int(sizes.sum())
+        self.total_size = total
+        starts = np.cumsum(sizes) - sizes
+        self.region = np.repeat(np.arange(K, dtype=np.int32), sizes)
+
+        # Расстановка по квадрантам внутри каждого региона, как в Population
+        quadrants = (np.arange(total) - np.repeat(starts, sizes)) % 4
+        self.positions = self.rng.random((total, 2), dtype=dtypes['float'])
+        self.positions *= 0.4
+        self.positions += QUADRANT_OFFSETS[quadrants].astype(dtypes['float'])
+        self.velocities = self.rng.random((total, 2), dtype=dtypes['float'])
+        self.velocities -= 0.5
+        self.velocities *= self.movement_speed.astype(dtypes['float'])[self.region][:, np.newaxis]
+
+        self.status = np.zeros(total, dtype=dtypes['status'])
+        self.timers = np.zeros(total, dtype=dtypes['timers'])
+        infected = np.concatenate([start + self.rng.choice(size, count, replace=False)
+                                   for start, size, count in zip(starts, sizes, self.initial_infected)]
+                                  + [np.zeros(0, dtype=np.int64)])
+        self.status[infected] = Status.INFECTED.value
+        self.timers[infected] = self.recovery_time[self.region[infected]]
+
+        # Рабочие буферы на всех агентов, переиспользуются каждый шаг
+        self._mask2 = np.zeros((total, 2), dtype=bool)
+        self._noise = np.zeros((total, 2), dtype=dtypes['float'])
+        self._mask = np.zeros(total, dtype=bool)
+        self._mask_b = np.zeros(total, dtype=bool)
+        self._uniform = np.zeros(total, dtype=dtypes['float'])
+        self._gather = np.zeros(total, dtype=dtypes['float'])
+        self._keys = np.zeros(total, dtype=np.int64)
+
+        self._setup_migration(migration)
+
+        # История по регионам: строка (K, 4) на каждый шаг
+        self.history = History(row_shape=(K, 4), maxlen=history_size)
+        self.counts = self.census()
+        self.time = 0
+
+        # Карантин у каждого региона свой (с тем же гистерезисом, что в Population)
+        self.quarantine_active = np.zeros(K, dtype=bool)
+        self.current_movement_speed = self.movement_speed.astype(np.float64)
+
+    def _setup_migration(self, migration):
+        """Переводит матрицу переездов в строки по регионам-источникам"""
+        K = self.regions
+        if migration is None:
+            self._out_rate = None
+            return
+        src, dst, rate = (np.asarray(a) for a in migration)
+        keep = (rate > 0) & (src != dst)
+        src, dst, rate = src[keep].astype(np.int64), dst[keep].astype(np.int32), rate[keep].astype(np.float64)
+        order = np.lexsort((dst, src))
+        src, dst, rate = src[order], dst[order], rate[order]
+
+        out_rate = np.bincount(src, weights=rate, minlength=K)
+        if np.any(out_rate > 1 + 1e-9):
+            raise ValueError("Сумма вероятностей переезда из региона больше 1")
+        # Накопленные вероятности внутри строки, сдвинутые на 2 * номер региона, чтобы
+        # один searchsorted сразу по всем переезжающим находил ребро в своей строке
+        cumulative = np.cumsum(rate)
+        row_base = np.cumsum(out_rate) - out_rate
+        self._edge_keys = 2.0 * src + (cumulative - row_base[src])
+        self._edge_dst = dst
+        self._row_last = np.searchsorted(src, np.arange(K), side='right') - 1
+        self._out_rate = out_rate.astype(self._gather.dtype)
+
+    def census(self):
+        """Количество S, I, R, V в каждом регионе, массив (K, 4)"""
+        keys = self._keys
+        np.multiply(self.region, 4, out=keys)
+        keys += self.status
+        return np.bincount(keys, minlength=4 * self.regions).reshape(self.regions, 4)
+
+    @property
+    def region_sizes(self):
+        """Сколько агентов сейчас в каждом регионе (меняется из-за миграции)"""
+        return self.counts.sum(axis=1)
+
+    def update(self):
+        """Один шаг всех регионов сразу"""
+        self.time += 1
+        S, I, R, V = (Status.SUSCEPTIBLE.value, Status.INFECTED.value,
+                      Status.RECOVERED.value, Status.VACCINATED.value)
+        region = self.region
+
+        # Карантин по каждому региону
+        if self.quarantine_enabled.any():
+            infected_percent = self.counts[:, I] / np.maximum(self.region_sizes, 1)
+            start, stop = quarantine_switch(infected_percent, self.quarantine_threshold, self.quarantine_active)
+            start &= self.quarantine_enabled
+            self.quarantine_active[start] = True
+            self.quarantine_active[stop] = False
+            self.current_movement_speed[start] = self.movement_speed[start] * QUARANTINE_SLOWDOWN
+            self.current_movement_speed[stop] = self.movement_speed[stop]
+
+        # Движение и отражение от границ
+        self.positions += self.velocities
+        out = self._mask2
+        np.less_equal(self.positions, 0, out=out)
+        np.negative(self.velocities, out=self.velocities, where=out)
+        np.greater_equal(self.positions, 1, out=out)
+        np.negative(self.velocities, out=self.velocities, where=out)
+        np.clip(self.positions, 0, 1, out=self.positions)
+
+        noise = self._noise
+        self.rng.random(out=noise, dtype=noise.dtype)
+        noise -= 0.5
+        noise *= 0.002
+        self.velocities += noise
+
+        # Ограничение скорости: у каждого региона свой предел (квадраты сравниваем без корня)
+        speeds = noise[:, 0]
+        np.einsum('ij,ij->i', self.velocities, self.velocities, out=speeds)
+        limit = self._gather
+        np.take((self.current_movement_speed * 1.5) ** 2, region, out=limit)
+        too_fast = np.greater(speeds, limit, out=self._mask)
+        if too_fast.any():
+            np.divide(limit, speeds, out=speeds, where=too_fast)
+            np.sqrt(speeds, out=speeds, where=too_fast)
+            np.multiply(self.velocities, speeds[:, np.newaxis], out=self.velocities,
+                        where=too_fast[:, np.newaxis])
+
+        # Заражение: регион - группа в сетке клеток
+        if np.any(self.counts[:, I] > 0):
+            infected = np.flatnonzero(np.equal(self.status, I, out=self._mask))
+            susceptible = np.flatnonzero(np.equal(self.status, S, out=self._mask))
+            contacts = self.grid.contact_counts(self.positions[susceptible], self.positions[infected],
+                                                region[susceptible], region[infected])
+            exposed = np.nonzero(contacts)[0]
+            if len(exposed) > 0:
+                p = self.infection_rate[region[susceptible[exposed]]]
+                p_infection = 1.0 - (1.0 - p) ** contacts[exposed]
+                newly_infected = susceptible[exposed[self.rng.random(len(exposed)) < p_infection]]
+                self.status[newly_infected] = I
+                self.timers[newly_infected] = self.recovery_time[region[newly_infected]]
+
+        self._scan_timers()
+
+        # Счетчики пересчитываем один раз за шаг, дальше правим их по числу переходов
+        self.counts = self.census()
+        self._vaccinate()
+        self._migrate()
+        self.history.append(self.counts)
+
+    def _scan_timers(self):
+        """Выздоровление и потеря иммунитета (как Population._scan_timers, но
+        длительность иммунитета у каждого региона своя)"""
+        S, I, R = Status.SUSCEPTIBLE.value, Status.INFECTED.value, Status.RECOVERED.value
+        infected_mask = np.equal(self.status, I, out=self._mask)
+        np.subtract(self.timers, 1, out=self.timers, where=infected_mask)
+
+        recovery_mask = np.less_equal(self.timers, 0, out=self._mask_b)
+        recovery_mask &= infected_mask
+        recovering = np.flatnonzero(recovery_mask)
+        self.status[recovering] = R
+        self.timers[recovering] = self.immunity_time[self.region[recovering]]
+
+        recovered_mask = np.equal(self.status, R, out=self._mask)
+        immunity_loss_mask = np.greater(self.timers, 0, out=self._mask_b)
+        immunity_loss_mask &= recovered_mask
+        np.subtract(self.timers, 1, out=self.timers, where=immunity_loss_mask)
+
+        no_immunity_mask = np.less_equal(self.timers, 0, out=self._mask_b)
+        no_immunity_mask &= recovered_mask
+        np.copyto(self.status, S, where=no_immunity_mask)
+
+    def _vaccinate(self):
+        """В каждом регионе, где идет вакцинация, - vaccination_rate случайных восприимчивых.
+
+        Сначала каждый восприимчивый становится кандидатом с вероятностью чуть
+        больше нужной (с запасом), потом в каждом регионе берутся первые нужные
+        кандидаты в случайном порядке. Регионы, где кандидатов не хватило (почти
+        не бывает), добираются вторым проходом по всем их восприимчивым.
+        """
+        S, V = Status.SUSCEPTIBLE.value, Status.VACCINATED.value
+        vaccinating = (self.vaccination_enabled & (self.time >= self.vaccination_start)
+                       & (self.vaccination_rate > 0))
+        if not vaccinating.any():
+            return
+        available = self.counts[:, S]
+        need = np.where(vaccinating, np.minimum(self.vaccination_rate, available), 0)
+        if not need.any():
+            return
+
+        margin = need + 4 * np.sqrt(need) + 8
+        probability = np.where(need > 0, np.minimum(1.0, margin / np.maximum(available, 1)), 0.0)
+        chosen = self._pick_susceptible(probability, need)
+        got = np.bincount(self.region[chosen], minlength=self.regions)
+        short = got < need
+        if short.any():
+            # Заново выбираем в этих регионах среди всех восприимчивых
+            chosen = chosen[~short[self.region[chosen]]]
+            chosen = np.concatenate([chosen, self._pick_susceptible(short.astype(np.float64), need * short)])
+
+        self.status[chosen] = V
+        vaccinated = np.bincount(self.region[chosen], minlength=self.regions)
+        self.counts[:, S] -= vaccinated
+        self.counts[:, V] += vaccinated
+
+    def _pick_susceptible(self, probability, need):
+        """Случайные восприимчивые: кандидаты с вероятностью probability[регион],
+        из них в каждом регионе не больше need[регион]"""
+        uniform = self._uniform
+        self.rng.random(out=uniform, dtype=uniform.dtype)
+        threshold = self._gather
+        np.take(probability.astype(threshold.dtype), self.region, out=threshold)
+        candidate = np.less(uniform, threshold, out=self._mask)
+        candidate &= np.equal(self.status, Status.SUSCEPTIBLE.value, out=self._mask_b)
+        candidates = np.flatnonzero(candidate)
+
+        # Внутри региона порядок случайный: у кандидатов uniform равномерно на [0, p)
+        regions = self.region[candidates]
+        order = np.lexsort((uniform[candidates], regions))
+        candidates, regions = candidates[order], regions[order]
+        first = np.searchsorted(regions, np.arange(self.regions))
+        rank = np.arange(len(candidates)) - first[regions]
+        return candidates[rank < need[regions]]
+
+    def _migrate(self):
+        """Переезды по матрице миграции: у переехавших меняется только номер региона"""
+        if self._out_rate is None:
+            return
+        uniform = self._uniform
+        self.rng.random(out=uniform, dtype=uniform.dtype)
+        threshold = self._gather
+        np.take(self._out_rate, self.region, out=threshold)
+        moving = np.flatnonzero(np.less(uniform, threshold, out=self._mask))
+        if len(moving) == 0:
+            return
+
+        # При условии переезда uniform равномерно на [0, out_rate): по нему же выбираем куда
+        src = self.region[moving]
+        edge = np.searchsorted(self._edge_keys, 2.0 * src + uniform[moving], side='right')
+        np.minimum(edge, self._row_last[src], out=edge)
+        dst = self._edge_dst[edge]
+        self.region[moving] = dst
+
+        status = self.status[moving].astype(np.int64)
+        self.counts -= np.bincount(4 * src + status, minlength=4 * self.regions).reshape(self.regions, 4)
+        self.counts += np.bincount(4 * dst + status, minlength=4 * self.regions).reshape(self.regions, 4)
+
+    def run(self, steps):
+        """Прогоняет все регионы на steps шагов"""
+        self.history.reserve(steps)
+        for _ in range(steps):
+            self.update()
+        return self
+
+    def region_history(self, region):
+        """История S/I/R/V одного региона, массив (шаги, 4)"""
+        return self.history.data[:, region]
+
+    def total_history(self):
+        """История S/I/R/V по всем регионам вместе, массив (шаги, 4)"""
+        return self.history.data.sum(axis=1)
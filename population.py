@@ -3,6 +3,11 @@
 
 import numpy as np
 from enum import Enum
+from spatial import CellGrid, QUERY_BLOCK
+from history import History
+from profiling import PhaseStats
+from scheduler import EventCalendar
+from eventlog import EventLog
 
 # Перечисление возможных статусов (не уверен, что это нужно, но звучит умно)
 class Status(Enum):
@@ -11,11 +16,139 @@ class Status(Enum):
     RECOVERED = 2    # выздоровел (с иммунитетом)
     VACCINATED = 3   # вакцинирован
 
-class Population:
+# Версия динамики модели: увеличивать при любом изменении, от которого меняются
+# результаты прогонов (по ней сбрасывается кэш свипов параметров)
+ENGINE_VERSION = 1
+
+# Смещения квадрантов для начальной расстановки людей
+QUADRANT_OFFSETS = np.array([[0.1, 0.1], [0.5, 0.1], [0.1, 0.5], [0.5, 0.5]])
+
+# Типы массивов: обычный и компактный (для популяций в миллионы агентов)
+DTYPES = {
+    False: {'status': np.int64, 'timers': np.int64, 'float': np.float64},
+    True: {'status': np.int8, 'timers': np.int16, 'float': np.float32},
+}
+
+# Что делать в run(), когда эпидемия закончилась
+EXTINCTION_MODES = (None, 'stop', 'skip')
+
+# Карантин: во сколько раз падает скорость и при какой доле от порога он снимается
+QUARANTINE_SLOWDOWN = 0.3
+QUARANTINE_RELEASE = 0.5
+
+
+def quarantine_switch(infected_percent, threshold, active):
+    """Гистерезис карантина: (вводится, снимается) на этом шаге.
+
+    Карантин вводится при доле зараженных >= threshold и снимается, когда она
+    падает ниже половины порога. Работает и для одного значения, и для массивов
+    по репликам или регионам.
+    """
+    start = (infected_percent >= threshold) & np.logical_not(active)
+    stop = (infected_percent < threshold * QUARANTINE_RELEASE) & active
+    return start, stop
+
+
+class HistoryColumns:
+    """Старые списки истории - просто столбцы общего массива history (только для чтения)"""
+
+    @property
+    def history_susceptible(self):
+        return self.history.column(Status.SUSCEPTIBLE.value)
+
+    @property
+    def history_infected(self):
+        return self.history.column(Status.INFECTED.value)
+
+    @property
+    def history_recovered(self):
+        return self.history.column(Status.RECOVERED.value)
+
+    @property
+    def history_vaccinated(self):
+        return self.history.column(Status.VACCINATED.value)
+
+
+class PolicyMixin(HistoryColumns):
+    """Карантин и вакцинация одной популяции (общие для Population и TiledPopulation).
+
+    Нужны атрибуты size, time, status, rng, verbose, параметры карантина и
+    вакцинации, original_movement_speed и current_movement_speed.
+    """
+    events = None
+
+    def _apply_quarantine(self, infected_percent):
+        """Вводит или снимает карантин (в карантине люди двигаются медленнее)"""
+        if self.quarantine_enabled:
+            start, stop = quarantine_switch(infected_percent, self.quarantine_threshold,
+                                            self.quarantine_active)
+            if start:
+                self.current_movement_speed = self.original_movement_speed * QUARANTINE_SLOWDOWN
+                self.quarantine_active = True
+                if self.events is not None:
+                    self.events.record_policy(self.time, 'quarantine_start', infected_percent)
+                if self.verbose:
+                    print(f"День {self.time}: Введен карантин (заражено {infected_percent*100:.1f}% населения)")
+            elif stop:
+                self.current_movement_speed = self.original_movement_speed
+                self.quarantine_active = False
+                if self.events is not None:
+                    self.events.record_policy(self.time, 'quarantine_end', infected_percent)
+                if self.verbose:
+                    print(f"День {self.time}: Карантин снят (заражено {infected_percent*100:.1f}% населения)")
+
+        if self.quarantine_active:
+            self.quarantine_days += 1
+
+    def _vaccinate(self, available, infected_percent):
+        """Прививает до vaccination_rate случайных восприимчивых (available - сколько
+        их сейчас), если вакцинация уже идет. Возвращает число привитых."""
+        if not self.vaccination_enabled or self.time < self.vaccination_start:
+            return 0
+        to_vaccinate = min(self.vaccination_rate, available)
+        if to_vaccinate <= 0:
+            return 0
+
+        vaccinated_idx = self._sample_susceptible(to_vaccinate, available)
+        self.status[vaccinated_idx] = Status.VACCINATED.value
+
+        # если начинаем вакцинацию, выводим сообщение
+        if self.time == self.vaccination_start:
+            if self.events is not None:
+                self.events.record_policy(self.time, 'vaccination_start', infected_percent)
+            if self.verbose:
+                print(f"День {self.time}: Началась вакцинация населения")
+        return len(vaccinated_idx)
+
+    def _sample_susceptible(self, count, available):
+        """count случайных восприимчивых без повторов (available - сколько их всего).
+
+        Пока восприимчивых много, тянем случайные номера среди всех агентов и
+        отбрасываем лишних - так не нужен список всех восприимчивых на каждом шаге.
+        """
+        S = Status.SUSCEPTIBLE.value
+        if 4 * available >= self.size and 4 * count <= available:
+            candidates = np.zeros(0, dtype=np.int64)
+            while len(candidates) < count:
+                draw = self.rng.integers(0, self.size, 2 * (count - len(candidates)) + 8)
+                draw = draw[self.status[draw] == S]
+                candidates = np.concatenate([candidates, draw])
+                # убираем повторы, сохраняя порядок первого появления
+                _, first = np.unique(candidates, return_index=True)
+                candidates = candidates[np.sort(first)]
+            return candidates[:count]
+
+        potential_vaccinated = np.flatnonzero(self.status == S)
+        return self.rng.choice(potential_vaccinated, count, replace=False)
+
+
+class Population(PolicyMixin):
     def __init__(self, size=200, initial_infected=5, infection_rate=0.3, 
                  recovery_time=150, immunity_time=200, interaction_radius=0.03, 
                  movement_speed=0.01, quarantine_enabled=False, quarantine_threshold=30,
-                 vaccination_enabled=False, vaccination_start=300, vaccination_rate=3):
+                 vaccination_enabled=False, vaccination_start=300, vaccination_rate=3,
+                 engine='grid', rng=None, verbose=True, history_size=None, compact=False,
+                 stats=None, transitions='calendar', events=None):
         
         # Основные параметры
         self.size = size
@@ -24,6 +157,36 @@ class Population:
         self.immunity_time = immunity_time
         self.interaction_radius = interaction_radius
         
+        # Движок заражения: 'grid' - сетка клеток, 'loop' - старый двойной цикл (эталон для проверки)
+        if engine not in ('grid', 'loop'):
+            raise ValueError(f"Неизвестный движок: {engine}")
+        self.engine = engine
+        self.grid = CellGrid(interaction_radius)
+        
+        # Переходы между статусами: 'calendar' - календарь событий (разбираются только
+        # агенты, у которых что-то происходит на этом шаге), 'scan' - проход по всем таймерам
+        if transitions not in ('calendar', 'scan'):
+            raise ValueError(f"Неизвестный способ переходов: {transitions}")
+        self.transitions = transitions
+        
+        # Компактное хранение: int8 статусы, int16 таймеры, float32 координаты
+        # (примерно 19 байт на агента вместо 48)
+        self.compact = compact
+        dtypes = DTYPES[compact]
+        if max(recovery_time, immunity_time) > np.iinfo(dtypes['timers']).max:
+            raise ValueError("recovery_time и immunity_time не помещаются в int16, выключите compact")
+        
+        # Свой генератор случайных чисел (можно передать seed или готовый Generator),
+        # чтобы параллельные прогоны не зависели от глобального np.random
+        self.rng = np.random.default_rng(rng)
+        # Печатать ли сообщения о карантине и вакцинации (в пакетных прогонах не нужно)
+        self.verbose = verbose
+        # Замер времени по фазам шага: PhaseStats (или True - создать свой), None - выключено
+        self.stats = PhaseStats() if stats is True else stats
+        # Журнал заражений (кто кого заразил) и мер: EventLog (или True - создать свой),
+        # None или False - выключено
+        self.events = EventLog() if events is True else (events or None)
+        
         # Флаги и настройки для особых условий
         self.quarantine_enabled = quarantine_enabled
         self.quarantine_threshold = quarantine_threshold / 100  # переводим проценты в долю
@@ -33,141 +196,406 @@ class Population:
         self.vaccination_rate = vaccination_rate
         
         # Инициализация позиций и скоростей (разделяем людей на 4 части чтобы не все в одной куче были)
-        self.positions = np.zeros((size, 2))
-        for i in range(size):
-            quadrant = i % 4
-            if quadrant == 0:
-                self.positions[i] = np.random.rand(2) * 0.4 + np.array([0.1, 0.1])
-            elif quadrant == 1:
-                self.positions[i] = np.random.rand(2) * 0.4 + np.array([0.5, 0.1])
-            elif quadrant == 2:
-                self.positions[i] = np.random.rand(2) * 0.4 + np.array([0.1, 0.5])
-            else:
-                self.positions[i] = np.random.rand(2) * 0.4 + np.array([0.5, 0.5])
+        # (агент i попадает в квадрант i % 4; смещения прибавляются срезами, без
+        # временных массивов на всех агентов)
+        self.positions = self.rng.random((size, 2), dtype=dtypes['float'])
+        self.positions *= 0.4
+        for quadrant, offset in enumerate(QUADRANT_OFFSETS.astype(dtypes['float'])):
+            self.positions[quadrant::4] += offset
         
         # Изначальные скорости (случайное направление)
-        self.velocities = (np.random.rand(size, 2) - 0.5) * movement_speed
+        self.velocities = self.rng.random((size, 2), dtype=dtypes['float'])
+        self.velocities -= 0.5
+        self.velocities *= movement_speed
         
         # Инициализация статусов и таймеров
-        self.status = np.zeros(size, dtype=int)
-        self.timers = np.zeros(size, dtype=int)
+        self.status = np.zeros(size, dtype=dtypes['status'])
+        self.timers = np.zeros(size, dtype=dtypes['timers'])
         
         # Заражение начального числа людей
-        self.status[np.random.choice(range(size), initial_infected, replace=False)] = Status.INFECTED.value
+        initial = self.rng.choice(size, initial_infected, replace=False)
+        self.status[initial] = Status.INFECTED.value
         self.timers[self.status == Status.INFECTED.value] = self.recovery_time
+        if self.events is not None:
+            self.events.record_infections(0, initial, -1, self.positions[initial])
+        
+        # Рабочие буферы, которые переиспользуются на каждом шаге, чтобы шаг
+        # почти ничего не выделял
+        self._mask2 = np.zeros((size, 2), dtype=bool)
+        self._noise = np.zeros((size, 2), dtype=dtypes['float'])
+        self._mask = np.zeros(size, dtype=bool)
+        self._mask_b = np.zeros(size, dtype=bool)
+        # Номера агентов в списках шага (новые зараженные, календарь): в компактном режиме int32
+        self._index_dtype = np.int32 if compact else np.int64
         
         # История для графиков (сюда записывается количество людей в каждом статусе на каждом шаге)
-        self.history_susceptible = []
-        self.history_infected = []
-        self.history_recovered = []
-        self.history_vaccinated = []
+        # history_size - хранить только последние столько шагов (кольцевой буфер)
+        self.history = History(maxlen=history_size)
+        # Текущие количества S, I, R, V (полный пересчет только здесь, дальше
+        # они обновляются по числу переходов за шаг)
+        self.counts = self.census()
         
         # Счетчик времени
         self.time = 0
         
+        # Календарь выздоровлений и потери иммунитета (в режиме 'calendar')
+        self.calendar = EventCalendar(max(recovery_time, immunity_time) + 2)
+        self.rebuild_calendar()
+        
+        # Итоговые показатели: всего заражений (с начальными) и дней карантина
+        self.total_infections = int(self.counts[Status.INFECTED.value])
+        self.quarantine_days = 0
+        
         # Запоминаем изначальную скорость, чтобы вернуться к ней после карантина
         self.original_movement_speed = movement_speed
         self.current_movement_speed = movement_speed
         
     def update(self):
         """Обновляет состояние популяции на один шаг времени"""
+        self.step()
+        return self.status.copy()
+    
+    def step(self):
+        """Один шаг симуляции на месте (update без копии статусов)"""
         self.time += 1
+        S, I, R, V = (Status.SUSCEPTIBLE.value, Status.INFECTED.value,
+                      Status.RECOVERED.value, Status.VACCINATED.value)
+        stats = self.stats
+        if stats is not None:
+            stats.start()
         
         # Применяем карантин если нужно (в карантине люди двигаются медленнее)
-        infected_percent = np.sum(self.status == Status.INFECTED.value) / self.size
-        
-        if self.quarantine_enabled:
-            if infected_percent >= self.quarantine_threshold and not self.quarantine_active:
-                # Вводим карантин
-                self.current_movement_speed = self.original_movement_speed * 0.3  # уменьшаем скорость на 70%
-                self.quarantine_active = True
-                print(f"День {self.time}: Введен карантин (заражено {infected_percent*100:.1f}% населения)")
-            
-            elif infected_percent < self.quarantine_threshold * 0.5 and self.quarantine_active:
-                # Снимаем карантин если заражено меньше половины порогового значения
-                self.current_movement_speed = self.original_movement_speed
-                self.quarantine_active = False
-                print(f"День {self.time}: Карантин снят (заражено {infected_percent*100:.1f}% населения)")
+        infected_percent = self.counts[I] / self.size
+        self._apply_quarantine(infected_percent)
+        if stats is not None:
+            stats.mark('quarantine')
         
         # Обновление позиций
         self.positions += self.velocities
+        if stats is not None:
+            stats.mark('movement')
         
-        # Отражение от границ
-        mask_x = (self.positions[:, 0] <= 0) | (self.positions[:, 0] >= 1)
-        mask_y = (self.positions[:, 1] <= 0) | (self.positions[:, 1] >= 1)
-        self.velocities[mask_x, 0] *= -1
-        self.velocities[mask_y, 1] *= -1
+        # Отражение от границ (по каждой координате отдельно)
+        out = self._mask2
+        np.less_equal(self.positions, 0, out=out)
+        np.negative(self.velocities, out=self.velocities, where=out)
+        np.greater_equal(self.positions, 1, out=out)
+        np.negative(self.velocities, out=self.velocities, where=out)
         
         # Применение границ (чтобы точки не вылезали за пределы)
-        self.positions = np.clip(self.positions, 0, 1)
+        np.clip(self.positions, 0, 1, out=self.positions)
+        if stats is not None:
+            stats.mark('boundary')
         
         # Добавим небольшие случайные изменения в скорости для более естественного движения
         # Использую маленькие значения чтобы движение было плавным
-        self.velocities += (np.random.rand(self.size, 2) - 0.5) * 0.002
+        noise = self._noise
+        self.rng.random(out=noise, dtype=noise.dtype)
+        noise -= 0.5
+        noise *= 0.002
+        self.velocities += noise
         
         # Нормализуем скорости, чтобы они не становились слишком большими или маленькими
-        speeds = np.linalg.norm(self.velocities, axis=1)
-        too_fast = speeds > self.current_movement_speed * 1.5
-        if np.any(too_fast):
-            scale = (self.current_movement_speed * 1.5) / speeds[too_fast]
-            self.velocities[too_fast] *= scale[:, np.newaxis]
-        
-        # Обработка инфекций
-        infected = np.where(self.status == Status.INFECTED.value)[0]
-        susceptible = np.where(self.status == Status.SUSCEPTIBLE.value)[0]
-        
-        if len(infected) > 0 and len(susceptible) > 0:
-            # Вычисление заражений (не оптимальный код, но работает)
-            for s_idx in susceptible:
-                # Проверяем расстояние до каждого инфицированного
-                for i_idx in infected:
-                    distance = np.linalg.norm(self.positions[s_idx] - self.positions[i_idx])
-                    
-                    # Если расстояние меньше радиуса взаимодействия, есть шанс заражения
-                    if distance < self.interaction_radius:
-                        # тут тупая проверка, но поработает для моделирования
-                        if np.random.rand() < self.infection_rate:
-                            self.status[s_idx] = Status.INFECTED.value
-                            self.timers[s_idx] = self.recovery_time
-                            break  # переходим к следующему восприимчивому
+        # (квадрат скорости считаем в первый столбец буфера шума, он уже не нужен)
+        speeds = noise[:, 0]
+        np.einsum('ij,ij->i', self.velocities, self.velocities, out=speeds)
+        limit = self.current_movement_speed * 1.5
+        too_fast = np.greater(speeds, limit * limit, out=self._mask)
+        if too_fast.any():
+            np.sqrt(speeds, out=speeds)
+            np.divide(limit, speeds, out=speeds, where=too_fast)
+            np.multiply(self.velocities, speeds[:, np.newaxis], out=self.velocities,
+                        where=too_fast[:, np.newaxis])
+        if stats is not None:
+            stats.mark('velocity')
+        
+        # Обработка инфекций (если зараженных нет, фаза контактов пропускается целиком)
+        new_infections = 0
+        if self.counts[I] > 0 and self.counts[S] > 0:
+            if self.engine == 'loop':
+                infected = np.flatnonzero(np.equal(self.status, I, out=self._mask))
+                susceptible = np.flatnonzero(np.equal(self.status, S, out=self._mask))
+                newly_infected = self._infect_loop(susceptible, infected)
+            else:
+                newly_infected = self._infect_grid()
+            new_infections = len(newly_infected)
+            if self.transitions == 'calendar':
+                self.calendar.schedule(self.time + max(self.recovery_time - 1, 0), newly_infected)
+        if stats is not None:
+            stats.mark('infection')
+        
+        if self.transitions == 'calendar':
+            recovered, lost_immunity = self._process_events()
+        else:
+            recovered, lost_immunity = self._scan_timers()
+        if stats is not None:
+            stats.mark('transitions')
+        
+        # Вакцинация (если включена и наступило время), только восприимчивых
+        vaccinated = self._vaccinate(self.counts[S] + lost_immunity - new_infections, infected_percent)
+        if stats is not None:
+            stats.mark('vaccination')
+        
+        # Сохранение истории для графиков: счетчики сдвигаем на число переходов
+        # за шаг, без прохода по всем статусам
+        self.counts[S] += lost_immunity - new_infections - vaccinated
+        self.counts[I] += new_infections - recovered
+        self.counts[R] += recovered - lost_immunity
+        self.counts[V] += vaccinated
+        self.total_infections += new_infections
+        self.history.append(self.counts)
+        if stats is not None:
+            stats.mark('census')
+            stats.end_step()
+    
+    def census(self):
+        """Количество людей в каждом статусе: массив [S, I, R, V]"""
+        return np.bincount(self.status, minlength=len(Status))
+    
+    def run(self, steps, on_extinction=None):
+        """Прогоняет симуляцию на steps шагов без всякой графики.
+        
+        on_extinction - что делать, когда эпидемия закончилась (нет ни
+        зараженных, ни выздоровевших, которые потом снова станут восприимчивыми):
+        None - честно шагать дальше, 'stop' - остановиться, 'skip' - перепрыгнуть
+        оставшиеся шаги через fast_forward.
+        """
+        if on_extinction not in EXTINCTION_MODES:
+            raise ValueError(f"Неизвестный режим on_extinction: {on_extinction}")
+        self.history.reserve(steps)
+        for done in range(steps):
+            if on_extinction is not None and self.is_quiescent():
+                if on_extinction == 'skip':
+                    self.fast_forward(steps - done)
+                break
+            self.step()
+        return self
+    
+    def is_quiescent(self):
+        """Эпидемия закончилась: дальше могут меняться только позиции и вакцинация"""
+        return (self.counts[Status.INFECTED.value] == 0 and
+                self.counts[Status.RECOVERED.value] == 0 and
+                not self.quarantine_active)
+    
+    def fast_forward(self, steps):
+        """Перепрыгивает steps шагов затихшей эпидемии.
+        
+        Вакцинация и история считаются сразу за все шаги, а движение агентов не
+        моделируется: позиции и скорости остаются такими, какими были.
+        """
+        S, V = Status.SUSCEPTIBLE.value, Status.VACCINATED.value
+        if steps <= 0:
+            return
+        times = self.time + np.arange(1, steps + 1)
+        vaccinated = np.zeros(steps, dtype=np.int64)
+        if self.vaccination_enabled:
+            per_step = np.where(times >= self.vaccination_start, self.vaccination_rate, 0)
+            vaccinated = np.minimum(np.cumsum(per_step), self.counts[S])
+        
+        total = int(vaccinated[-1])
+        if total > 0:
+            self.status[self._sample_susceptible(total, self.counts[S])] = V
+            if times[0] <= self.vaccination_start <= times[-1]:
+                if self.events is not None:
+                    self.events.record_policy(self.vaccination_start, 'vaccination_start',
+                                              self.counts[Status.INFECTED.value] / self.size)
+                if self.verbose:
+                    print(f"День {self.vaccination_start}: Началась вакцинация населения")
+        
+        rows = np.tile(self.counts, (steps, 1))
+        rows[:, S] -= vaccinated
+        rows[:, V] += vaccinated
+        self.history.extend(rows)
+        self.counts = rows[-1].copy()
+        self.time += steps
+    
+    def _scan_timers(self):
+        """Переходы проходом по всем таймерам, возвращает (выздоровело, потеряли иммунитет)"""
+        S, I, R = Status.SUSCEPTIBLE.value, Status.INFECTED.value, Status.RECOVERED.value
         
         # Обновление таймеров инфицированных
-        infected_mask = self.status == Status.INFECTED.value
-        self.timers[infected_mask] -= 1
+        infected_mask = np.equal(self.status, I, out=self._mask)
+        np.subtract(self.timers, 1, out=self.timers, where=infected_mask)
         
         # Выздоровление
-        recovery_mask = (self.status == Status.INFECTED.value) & (self.timers <= 0)
-        self.status[recovery_mask] = Status.RECOVERED.value
-        self.timers[recovery_mask] = self.immunity_time
+        recovery_mask = np.less_equal(self.timers, 0, out=self._mask_b)
+        recovery_mask &= infected_mask
+        np.copyto(self.status, R, where=recovery_mask)
+        np.copyto(self.timers, self.immunity_time, where=recovery_mask)
+        recovered = np.count_nonzero(recovery_mask)
+        
+        # Потеря иммунитета
+        recovered_mask = np.equal(self.status, R, out=self._mask)
+        immunity_loss_mask = np.greater(self.timers, 0, out=self._mask_b)
+        immunity_loss_mask &= recovered_mask
+        np.subtract(self.timers, 1, out=self.timers, where=immunity_loss_mask)
+        
+        no_immunity_mask = np.less_equal(self.timers, 0, out=self._mask_b)
+        no_immunity_mask &= recovered_mask
+        np.copyto(self.status, S, where=no_immunity_mask)
+        lost_immunity = np.count_nonzero(no_immunity_mask)
+        return recovered, lost_immunity
+    
+    def _process_events(self):
+        """Переходы по календарю: разбираем только корзину текущего шага"""
+        S, I, R = Status.SUSCEPTIBLE.value, Status.INFECTED.value, Status.RECOVERED.value
+        due = self.calendar.pop(self.time)
+        if len(due) == 0:
+            return 0, 0
+        status = self.status[due]
+        
+        # Выздоровление: дальше ждем потери иммунитета
+        recovering = due[status == I]
+        self.status[recovering] = R
+        loss_step = self.time + max(self.immunity_time - 1, 0)
+        if loss_step > self.time:
+            self.calendar.schedule(loss_step, recovering)
+            losing = due[status == R]
+        else:
+            # иммунитет на один шаг или меньше теряется в тот же шаг
+            losing = due[(status == R) | (status == I)]
         
         # Потеря иммунитета
-        immunity_loss_mask = (self.status == Status.RECOVERED.value) & (self.timers > 0)
-        self.timers[immunity_loss_mask] -= 1
-        
-        no_immunity_mask = (self.status == Status.RECOVERED.value) & (self.timers <= 0)
-        self.status[no_immunity_mask] = Status.SUSCEPTIBLE.value
-        
-        # Вакцинация (если включена и наступило время)
-        if self.vaccination_enabled and self.time >= self.vaccination_start:
-            # Находим людей, которых можно вакцинировать (только восприимчивые)
-            potential_vaccinated = np.where(self.status == Status.SUSCEPTIBLE.value)[0]
-            
-            if len(potential_vaccinated) > 0:
-                # Вакцинируем определенное количество людей
-                to_vaccinate = min(self.vaccination_rate, len(potential_vaccinated))
+        self.status[losing] = S
+        return len(recovering), len(losing)
+    
+    def rebuild_calendar(self):
+        """Заполняет календарь по таймерам (после создания или загрузки чекпойнта).
+        
+        Агент с таймером T выздоравливает (или теряет иммунитет) на шаге
+        time + max(T, 1) - ровно тогда же, когда это случилось бы при проходе
+        по таймерам.
+        """
+        self.calendar.clear()
+        if self.transitions != 'calendar':
+            return
+        active = np.flatnonzero((self.status == Status.INFECTED.value) |
+                                (self.status == Status.RECOVERED.value))
+        due = self.time + np.maximum(self.timers[active].astype(np.int64), 1)
+        order = np.argsort(due, kind='stable')
+        steps, starts = np.unique(due[order], return_index=True)
+        for step, group in zip(steps, np.split(active[order], starts[1:])):
+            self.calendar.schedule(int(step), group)
+    
+    def sync_timers(self):
+        """Записывает в timers оставшееся время по календарю (в режиме 'calendar'
+        таймеры на каждом шаге не уменьшаются)"""
+        if self.transitions != 'calendar':
+            return
+        for step, agents in self.calendar.events():
+            self.timers[agents] = step - self.time
+    
+    def _infect_loop(self, susceptible, infected):
+        """Эталонное заражение: перебор всех пар восприимчивый-инфицированный"""
+        newly_infected = []
+        infectors = []
+        # Вычисление заражений (не оптимальный код, но работает)
+        for s_idx in susceptible:
+            # Проверяем расстояние до каждого инфицированного
+            for i_idx in infected:
+                distance = np.linalg.norm(self.positions[s_idx] - self.positions[i_idx])
                 
-                if to_vaccinate > 0:
-                    vaccinated_idx = np.random.choice(potential_vaccinated, to_vaccinate, replace=False)
-                    self.status[vaccinated_idx] = Status.VACCINATED.value
-                    
-                    # если начинаем вакцинацию, выводим сообщение
-                    if self.time == self.vaccination_start:
-                        print(f"День {self.time}: Началась вакцинация населения")
-        
-        # Сохранение истории для графиков
-        self.history_susceptible.append(np.sum(self.status == Status.SUSCEPTIBLE.value))
-        self.history_infected.append(np.sum(self.status == Status.INFECTED.value))
-        self.history_recovered.append(np.sum(self.status == Status.RECOVERED.value))
-        self.history_vaccinated.append(np.sum(self.status == Status.VACCINATED.value))
-        
-        return self.status.copy()
\ No newline at end of file
+                # Если расстояние меньше радиуса взаимодействия, есть шанс заражения
+                if distance < self.interaction_radius:
+                    # тут тупая проверка, но поработает для моделирования
+                    if self.rng.random() < self.infection_rate:
+                        self.status[s_idx] = Status.INFECTED.value
+                        self.timers[s_idx] = self.recovery_time
+                        newly_infected.append(s_idx)
+                        infectors.append(i_idx)
+                        break  # переходим к следующему восприимчивому
+        newly_infected = np.array(newly_infected, dtype=np.int64)
+        if self.events is not None:
+            self.events.record_infections(self.time, newly_infected, infectors, self.positions[newly_infected])
+        return newly_infected
+    
+    def _status_blocks(self, value):
+        """Номера агентов со статусом value кусками по QUERY_BLOCK (по возрастанию)"""
+        for first in range(0, self.size, QUERY_BLOCK):
+            local = np.flatnonzero(self.status[first:first + QUERY_BLOCK] == value)
+            if len(local):
+                yield (local + first).astype(self._index_dtype)
+    
+    def _infect_grid(self):
+        """Заражение через сетку клеток.
+        
+        Для каждого восприимчивого считаем число k инфицированных в радиусе,
+        вероятность заразиться за шаг равна 1 - (1 - p)^k - то же самое,
+        что k независимых попыток в старом цикле.
+        
+        Меньшее из множеств (инфицированные или восприимчивые) раскладывается по
+        клеткам, а большее берется подряд кусками по QUERY_BLOCK агентов. Так
+        списка, координат и сортировки большего множества нет вовсе, и память
+        шага зависит от меньшего множества и размера куска, а не от N.
+        Случайные числа тянутся в том же порядке, что и одним вызовом, поэтому
+        результат от разбиения на куски не зависит.
+        """
+        S, I = Status.SUSCEPTIBLE.value, Status.INFECTED.value
+        newly_infected, contacts, uniforms = [], [], []
+        
+        def infect(susceptible, k):
+            exposed = np.nonzero(k)[0]
+            if len(exposed) == 0:
+                return
+            p_infection = 1.0 - (1.0 - self.infection_rate) ** k[exposed]
+            draws = self.rng.random(len(exposed))
+            hit = draws < p_infection
+            newly_infected.append(susceptible[exposed[hit]])
+            if self.events is not None:
+                contacts.append(k[exposed[hit]])
+                uniforms.append(draws[hit] / p_infection[hit])
+        
+        if self.counts[I] <= self.counts[S]:
+            infected_positions = self.positions[np.flatnonzero(np.equal(self.status, I, out=self._mask))]
+            index = self.grid.cell_index(infected_positions)
+            for susceptible in self._status_blocks(S):
+                k = np.zeros(len(susceptible), dtype=np.int64)
+                for ia, _ in self.grid.table_pairs(self.positions[susceptible], infected_positions, index):
+                    k += np.bincount(ia, minlength=len(susceptible))
+                infect(susceptible, k)
+        else:
+            susceptible = np.flatnonzero(np.equal(self.status, S, out=self._mask)).astype(self._index_dtype)
+            susceptible_positions = self.positions[susceptible]
+            index = self.grid.cell_index(susceptible_positions)
+            k = np.zeros(len(susceptible), dtype=np.int64)
+            for infected in self._status_blocks(I):
+                for _, ib in self.grid.table_pairs(self.positions[infected], susceptible_positions, index):
+                    k += np.bincount(ib, minlength=len(susceptible))
+            infect(susceptible, k)
+        if not newly_infected:
+            return np.zeros(0, dtype=self._index_dtype)
+        
+        newly_infected = np.concatenate(newly_infected)
+        if self.events is not None:
+            self._record_grid_infectors(newly_infected, np.concatenate(contacts), np.concatenate(uniforms))
+        self.status[newly_infected] = I
+        self.timers[newly_infected] = self.recovery_time
+        return newly_infected
+    
+    def _record_grid_infectors(self, newly_infected, k, u):
+        """Пишет в журнал заражения шага, выбирая заразившего среди контактов.
+        
+        При k контактах заражение - это k одинаковых попыток, так что заразивший
+        равновероятно любой из k. Случайное число берем из того же броска, которым
+        решалось заражение (при условии заражения draw / p равномерно на [0, 1)),
+        поэтому с журналом прогон идет бит в бит так же, как без него.
+        Контакты ищутся второй раз, но только для заразившихся (они раскладываются
+        по клеткам, а инфицированные идут кусками): у каждого берется контакт
+        номер pick в порядке, в котором они пришли. Вызывается до смены статусов.
+        """
+        I = Status.INFECTED.value
+        pick = np.minimum((u * k).astype(np.int64), k - 1)
+        seen = np.zeros(len(newly_infected), dtype=np.int64)
+        infectors = np.empty(len(newly_infected), dtype=np.int64)
+        new_positions = self.positions[newly_infected]
+        index = self.grid.cell_index(new_positions)
+        for infected in self._status_blocks(I):
+            for i_local, s_local in self.grid.table_pairs(self.positions[infected], new_positions, index):
+                order = np.argsort(s_local, kind='stable')
+                s_sorted = s_local[order]
+                block = np.bincount(s_local, minlength=len(newly_infected))
+                rank = np.arange(len(order)) - (np.cumsum(block) - block)[s_sorted] + seen[s_sorted]
+                chosen = rank == pick[s_sorted]
+                infectors[s_sorted[chosen]] = infected[i_local[order[chosen]]]
+                seen += block
+        self.events.record_infections(self.time, newly_infected, infectors, new_positions)
@@ -0,0 +1,61 @@
+# Замер времени по фазам шага симуляции
+# Population.step отмечает конец каждой фазы, если ему передан объект PhaseStats.
+# Без него проверка стоит одно сравнение с None на фазу.
+
+import time
+
+# Фазы шага в том порядке, в котором они идут в Population.step
+PHASES = ('quarantine', 'movement', 'boundary', 'velocity', 'infection',
+          'transitions', 'vaccination', 'census')
+
+
+class PhaseStats:
+    """Накапливает время по фазам шага.
+
+    callback(step_times) вызывается после каждого шага со словарем
+    {фаза: секунды} за этот шаг (например, чтобы писать в лог или график).
+    """
+
+    def __init__(self, callback=None):
+        self.callback = callback
+        self.totals = dict.fromkeys(PHASES, 0.0)
+        self.steps = 0
+        self.step_times = dict.fromkeys(PHASES, 0.0)
+        self._last = 0.0
+
+    def start(self):
+        self._last = time.perf_counter()
+
+    def mark(self, phase):
+        """Фаза phase закончилась: добавляем время с прошлой отметки"""
+        now = time.perf_counter()
+        self.step_times[phase] = now - self._last
+        self._last = now
+
+    def end_step(self):
+        for phase, seconds in self.step_times.items():
+            self.totals[phase] += seconds
+        self.steps += 1
+        if self.callback is not None:
+            self.callback(dict(self.step_times))
+        self.step_times = dict.fromkeys(PHASES, 0.0)
+
+    def reset(self):
+        self.totals = dict.fromkeys(PHASES, 0.0)
+        self.steps = 0
+
+    @property
+    def total(self):
+        return sum(self.totals.values())
+
+    def mean(self):
+        """Среднее время фазы на шаг, в секундах"""
+        return {phase: seconds / max(self.steps, 1) for phase, seconds in self.totals.items()}
+
+    def report(self):
+        """Табличка для печати: фаза, мс на шаг, доля от шага"""
+        total = self.total or 1.0
+        lines = [f"{'фаза':<12} {'мс/шаг':>10} {'доля':>7}"]
+        for phase, seconds in self.mean().items():
+            lines.append(f"{phase:<12} {seconds * 1000:>10.3f} {self.totals[phase] / total:>7.1%}")
+        return '\n'.join(lines)
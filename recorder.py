@@ -0,0 +1,232 @@
+# Запись траекторий агентов в файл на диске (np.memmap) и воспроизведение
+# Файл: заголовок фиксированного размера + блоки positions (шаги, N, 2),
+# status (шаги, N), флаг карантина (шаги,) и число S/I/R/V (шаги, 4). Все блоки
+# выделяются сразу, поэтому в памяти держать ничего не нужно.
+
+import json
+import struct
+import numpy as np
+from history import History
+from population import HistoryColumns
+
+MAGIC = b'EPITRAJ1'
+HEADER_SIZE = 4096
+# После MAGIC: сколько шагов уже записано (uint64) и длина JSON (uint32)
+_COUNTS = struct.Struct('<QI')
+
+# Параметры популяции, которые сохраняются в заголовке (нужны визуализатору)
+RECORDED_PARAMS = ('infection_rate', 'recovery_time', 'immunity_time', 'interaction_radius',
+                   'quarantine_enabled', 'quarantine_threshold',
+                   'vaccination_enabled', 'vaccination_start', 'vaccination_rate')
+
+
+def _layout(size, steps, position_dtype, status_dtype, census=True):
+    """Смещения и формы блоков данных в файле (census=False - старые файлы без counts)"""
+    position_dtype = np.dtype(position_dtype)
+    status_dtype = np.dtype(status_dtype)
+    positions_offset = HEADER_SIZE
+    status_offset = positions_offset + steps * size * 2 * position_dtype.itemsize
+    quarantine_offset = status_offset + steps * size * status_dtype.itemsize
+    layout = {
+        'positions': (positions_offset, position_dtype, (steps, size, 2)),
+        'status': (status_offset, status_dtype, (steps, size)),
+        'quarantine': (quarantine_offset, np.dtype(np.int8), (steps,)),
+    }
+    if census:
+        # Выравниваем на 8 байт, чтобы int32 не лежали невыровненными
+        counts_offset = -(-(quarantine_offset + steps) // 8) * 8
+        layout['counts'] = (counts_offset, np.dtype(np.int32), (steps, 4))
+    return layout
+
+
+def _file_size(layout):
+    return max(offset + int(np.prod(shape)) * dtype.itemsize for offset, dtype, shape in layout.values())
+
+
+def _open_blocks(path, header, mode):
+    layout = _layout(header['size'], header['steps'], header['position_dtype'], header['status_dtype'],
+                     header.get('census', False))
+    return {
+        name: np.memmap(path, dtype=dtype, mode=mode, offset=offset, shape=shape)
+        for name, (offset, dtype, shape) in layout.items()
+    }
+
+
+def _read_header(path):
+    with open(path, 'rb') as f:
+        raw = f.read(HEADER_SIZE)
+    if raw[:len(MAGIC)] != MAGIC:
+        raise ValueError(f"{path}: это не файл траекторий")
+    recorded, length = _COUNTS.unpack_from(raw, len(MAGIC))
+    start = len(MAGIC) + _COUNTS.size
+    header = json.loads(raw[start:start + length].decode('utf-8'))
+    return header, recorded
+
+
+class TrajectoryRecorder:
+    """Пишет позиции и статусы популяции на каждом шаге в memmap-файл"""
+
+    def __init__(self, path, population, steps, position_dtype=None, status_dtype=np.int8):
+        self.path = path
+        self.steps = steps
+        self.recorded = 0
+
+        self.header = {
+            'size': population.size,
+            'steps': steps,
+            'position_dtype': np.dtype(position_dtype or population.positions.dtype).str,
+            'status_dtype': np.dtype(status_dtype).str,
+            'start_time': population.time,
+            'census': True,
+            'params': {name: getattr(population, name) for name in RECORDED_PARAMS},
+        }
+        header_bytes = json.dumps(self.header).encode('utf-8')
+        if len(MAGIC) + _COUNTS.size + len(header_bytes) > HEADER_SIZE:
+            raise ValueError("Слишком большой заголовок файла траекторий")
+
+        # Создаем файл нужного размера сразу (дальше только пишем в memmap)
+        layout = _layout(population.size, steps, self.header['position_dtype'], self.header['status_dtype'])
+        total_size = _file_size(layout)
+        with open(path, 'wb') as f:
+            f.write(MAGIC + _COUNTS.pack(0, len(header_bytes)) + header_bytes)
+            f.truncate(total_size)
+        self._header_length = len(header_bytes)
+
+        self._blocks = _open_blocks(path, self.header, 'r+')
+
+    def record(self, population):
+        """Дописывает текущее состояние популяции следующим шагом"""
+        if self.recorded >= self.steps:
+            raise IndexError(f"Файл рассчитан на {self.steps} шагов")
+        i = self.recorded
+        self._blocks['positions'][i] = population.positions
+        self._blocks['status'][i] = population.status
+        self._blocks['quarantine'][i] = population.quarantine_active
+        # S/I/R/V популяция уже знает, так что при чтении не надо пересчитывать статусы
+        counts = getattr(population, 'counts', None)
+        if counts is None:
+            counts = np.bincount(population.status, minlength=4)
+        self._blocks['counts'][i] = counts
+        self.recorded += 1
+
+    def flush(self):
+        """Сбрасывает данные на диск и обновляет число записанных шагов в заголовке"""
+        for block in self._blocks.values():
+            block.flush()
+        with open(self.path, 'r+b') as f:
+            f.seek(len(MAGIC))
+            f.write(_COUNTS.pack(self.recorded, self._header_length))
+
+    def close(self):
+        self.flush()
+        self._blocks = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def record_run(population, steps, path, **kwargs):
+    """Прогоняет популяцию на steps шагов и пишет каждый шаг в файл"""
+    population.history.reserve(steps)
+    with TrajectoryRecorder(path, population, steps, **kwargs) as recorder:
+        for _ in range(steps):
+            population.step()
+            recorder.record(population)
+    return path
+
+
+class TrajectoryReader:
+    """Чтение записанных траекторий без загрузки файла в память.
+
+    Срезы по шагам и срезы агентов (slice) возвращаются как виды memmap без
+    копирования. Список индексов агентов - это fancy indexing numpy, он копирует
+    только выбранные строки.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.header, self.recorded = _read_header(path)
+        self.size = self.header['size']
+        self.start_time = self.header['start_time']
+        self.params = self.header['params']
+        self._blocks = _open_blocks(path, self.header, 'r')
+
+    def __len__(self):
+        return self.recorded
+
+    def _select(self, block, start, stop, agents):
+        data = self._blocks[block][:self.recorded][start:stop]
+        if agents is None:
+            return data
+        return data[:, agents]
+
+    def positions(self, start=None, stop=None, agents=None):
+        """Позиции на шагах [start, stop) для агентов agents (все по умолчанию)"""
+        return self._select('positions', start, stop, agents)
+
+    def status(self, start=None, stop=None, agents=None):
+        """Статусы на шагах [start, stop) для агентов agents"""
+        return self._select('status', start, stop, agents)
+
+    def quarantine(self, start=None, stop=None):
+        return self._blocks['quarantine'][:self.recorded][start:stop]
+
+    def census(self, start=None, stop=None):
+        """Количество S/I/R/V на каждом шаге, массив (шаги, 4).
+
+        Обычно это вид на блок counts, записанный вместе с шагами. В старых
+        файлах его нет, и тогда статусы пересчитываются по одному шагу, так что
+        временная память - N байт, а не весь файл.
+        """
+        if 'counts' in self._blocks:
+            return self._blocks['counts'][:self.recorded][start:stop]
+        status = self.status(start, stop)
+        counts = np.zeros((len(status), 4), dtype=np.int32)
+        for i, row in enumerate(status):
+            for value in range(4):
+                counts[i, value] = np.count_nonzero(row == value)
+        return counts
+
+
+class ReplayPopulation(HistoryColumns):
+    """Замена Population для визуализатора: update() берет следующий шаг из файла"""
+
+    def __init__(self, reader):
+        self.reader = reader
+        self.size = reader.size
+        for name, value in reader.params.items():
+            setattr(self, name, value)
+
+        self.frame = -1
+        self.time = reader.start_time
+        self.positions = reader.positions(0, 1)[0] if len(reader) else np.zeros((self.size, 2))
+        self.status = reader.status(0, 1)[0] if len(reader) else np.zeros(self.size, dtype=np.int8)
+        self.quarantine_active = False
+
+        # История копится по мере воспроизведения, как у настоящей популяции
+        self.history = History()
+        self._census = None
+
+    def __len__(self):
+        return len(self.reader)
+
+    def update(self):
+        if self.frame + 1 >= len(self.reader):
+            return self.status
+        self.frame += 1
+        self.time += 1
+        self.positions = self.reader.positions(self.frame, self.frame + 1)[0]
+        self.status = self.reader.status(self.frame, self.frame + 1)[0]
+        self.quarantine_active = bool(self.reader.quarantine(self.frame, self.frame + 1)[0])
+        self.history.append(self.census[self.frame])
+        return self.status
+
+    @property
+    def census(self):
+        """S/I/R/V по всем шагам записи (в старых файлах считается при первом обращении)"""
+        if self._census is None:
+            self._census = self.reader.census()
+        return self._census
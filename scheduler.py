@@ -0,0 +1,49 @@
+# Календарь событий для переходов между статусами
+# Время выздоровления и потери иммунитета известно заранее, поэтому агентов
+# можно сразу положить в "корзину" того шага, когда с ними что-то произойдет,
+# и на каждом шаге разбирать только одну корзину вместо прохода по всем таймерам.
+
+import numpy as np
+
+
+class EventCalendar:
+    """Кольцо корзин по шагам; horizon должен быть больше самой дальней задержки"""
+
+    def __init__(self, horizon):
+        self.horizon = horizon
+        # В корзине лежат пары (шаг, массив агентов)
+        self._buckets = [[] for _ in range(horizon)]
+        self.pending = 0
+
+    def __len__(self):
+        return self.pending
+
+    def schedule(self, step, agents):
+        """Запланировать событие на шаг step для агентов agents"""
+        if len(agents) == 0:
+            return
+        self._buckets[step % self.horizon].append((step, agents))
+        self.pending += len(agents)
+
+    def pop(self, step):
+        """Забрать всех агентов, у которых событие на шаге step"""
+        bucket = self._buckets[step % self.horizon]
+        if not bucket:
+            return np.zeros(0, dtype=np.int64)
+        due = [agents for when, agents in bucket if when == step]
+        # В кольце корзина может содержать только события этого шага
+        # (horizon больше любой задержки), но на всякий случай проверяем
+        bucket[:] = [(when, agents) for when, agents in bucket if when != step]
+        agents = np.concatenate(due) if len(due) > 1 else (due[0] if due else np.zeros(0, dtype=np.int64))
+        self.pending -= len(agents)
+        return agents
+
+    def clear(self):
+        for bucket in self._buckets:
+            bucket.clear()
+        self.pending = 0
+
+    def events(self):
+        """Все запланированные события: пары (шаг, массив агентов)"""
+        for bucket in self._buckets:
+            yield from bucket
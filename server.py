@@ -0,0 +1,314 @@
+# Сервер трансляции симуляции для нескольких зрителей
+# Окно matplotlib видно только одному человеку на одной машине. Здесь модель
+# считается один раз, а каждый шаг рассылается всем подключенным клиентам
+# компактными бинарными кадрами по TCP или WebSocket.
+#
+# Кадр (все числа little-endian):
+#   заголовок FRAME_HEADER: тип кадра, формат координат, флаги, время, размер, S/I/R/V
+#   координаты: size * 2 чисел float32 или uint16 (квантованные [0, 1] -> [0, 65535])
+#   ключевой кадр: статусы int8[size]
+#   дельта: число изменений uint32, индексы агентов uint32[n], новые статусы int8[n]
+# По TCP перед каждым кадром идет его длина (uint32), по WebSocket кадр - одно
+# бинарное сообщение.
+#
+# Медленный клиент не тормозит модель: у каждого клиента есть слот на один кадр,
+# и если клиент не успел забрать кадр, его затирает следующий. После пропуска
+# клиент получает ключевой кадр, потому что дельта считается от предыдущего шага.
+#
+#   python server.py --size 5000 --tcp-port 8765 --ws-port 8766 --fps 30
+
+import argparse
+import asyncio
+import base64
+import hashlib
+import struct
+import time
+import numpy as np
+from population import Population
+
+FRAME_HEADER = struct.Struct('<BBBxQI4I')
+KEYFRAME, DELTA = 1, 2
+POSITION_FORMATS = {'float32': 0, 'uint16': 1}
+FLAG_QUARANTINE = 1
+
+_LENGTH = struct.Struct('<I')
+_WS_GUID = b'258EAFA5-E914-47DA-95CA-C5AB0DC85B11'
+
+
+def quantize_positions(positions):
+    """Координаты [0, 1] -> uint16"""
+    return np.rint(np.clip(positions, 0.0, 1.0) * 65535).astype(np.uint16)
+
+
+class _Frame:
+    """Один шаг, закодированный один раз для всех клиентов"""
+
+    def __init__(self, time, counts, quarantine_active, positions, status, changed, position_format, keyframe):
+        self.keyframe = keyframe
+        flags = FLAG_QUARANTINE if quarantine_active else 0
+        size = len(status)
+        counts = [int(c) for c in counts]
+        self._heads = {kind: FRAME_HEADER.pack(kind, position_format, flags, time, size, *counts)
+                       for kind in (KEYFRAME, DELTA)}
+        self._positions = positions.tobytes()
+        self._status = status.tobytes()
+        self._delta = None
+        if changed is not None:
+            self._delta = (_LENGTH.pack(len(changed)) + changed.astype(np.uint32).tobytes()
+                           + status[changed].tobytes())
+        self._payloads = {}
+
+    def payload(self, keyframe):
+        """Байты кадра: ключевого или дельты (собираются один раз на все соединения)"""
+        kind = KEYFRAME if keyframe or self.keyframe or self._delta is None else DELTA
+        if kind not in self._payloads:
+            body = self._status if kind == KEYFRAME else self._delta
+            self._payloads[kind] = self._heads[kind] + self._positions + body
+        return self._payloads[kind]
+
+
+class _Client:
+    """Соединение с одним зрителем: слот на последний кадр и своя задача отправки"""
+
+    def __init__(self, send):
+        self.send = send
+        self.slot = None
+        self.closing = False
+        self.need_keyframe = True
+        self.ready = asyncio.Event()
+        self.sent = 0
+        self.dropped = 0
+
+    def offer(self, frame):
+        if self.slot is not None:
+            # Клиент не успел забрать прошлый кадр: затираем, дальше нужен ключевой
+            self.dropped += 1
+            self.need_keyframe = True
+        self.slot = frame
+        self.ready.set()
+
+    def close(self):
+        self.closing = True
+        self.ready.set()
+
+    async def pump(self):
+        while True:
+            await self.ready.wait()
+            self.ready.clear()
+            frame, self.slot = self.slot, None
+            if frame is not None:
+                keyframe, self.need_keyframe = self.need_keyframe, False
+                await self.send(frame.payload(keyframe))
+                self.sent += 1
+            if self.closing and self.slot is None:
+                return
+
+
+async def _tcp_send(writer, payload):
+    writer.write(_LENGTH.pack(len(payload)))
+    writer.write(payload)
+    await writer.drain()
+
+
+def _ws_header(opcode, length):
+    if length < 126:
+        return struct.pack('!BB', 0x80 | opcode, length)
+    if length < 1 << 16:
+        return struct.pack('!BBH', 0x80 | opcode, 126, length)
+    return struct.pack('!BBQ', 0x80 | opcode, 127, length)
+
+
+async def _ws_send(writer, payload):
+    writer.write(_ws_header(0x2, len(payload)))
+    writer.write(payload)
+    await writer.drain()
+
+
+async def _ws_handshake(reader, writer):
+    request = await reader.readuntil(b'\r\n\r\n')
+    key = None
+    for line in request.split(b'\r\n')[1:]:
+        name, _, value = line.partition(b':')
+        if name.strip().lower() == b'sec-websocket-key':
+            key = value.strip()
+    if key is None:
+        writer.write(b'HTTP/1.1 400 Bad Request\r\nContent-Length: 0\r\n\r\n')
+        await writer.drain()
+        return False
+    accept = base64.b64encode(hashlib.sha1(key + _WS_GUID).digest())
+    writer.write(b'HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n'
+                 b'Sec-WebSocket-Accept: ' + accept + b'\r\n\r\n')
+    await writer.drain()
+    return True
+
+
+async def _ws_read_until_close(reader, writer):
+    """Читает сообщения клиента (они нам не нужны), отвечает на ping и close"""
+    while True:
+        b0, b1 = await reader.readexactly(2)
+        opcode, length = b0 & 0x0F, b1 & 0x7F
+        if length == 126:
+            length, = struct.unpack('!H', await reader.readexactly(2))
+        elif length == 127:
+            length, = struct.unpack('!Q', await reader.readexactly(8))
+        mask = await reader.readexactly(4) if b1 & 0x80 else b'\0\0\0\0'
+        data = bytes(b ^ mask[i % 4] for i, b in enumerate(await reader.readexactly(length)))
+        if opcode == 0x8:
+            writer.write(_ws_header(0x8, len(data[:2])) + data[:2])
+            return
+        if opcode == 0x9:
+            writer.write(_ws_header(0xA, len(data)) + data)
+
+
+class SimulationServer:
+    """Считает population и рассылает шаги всем подключенным клиентам.
+
+    positions - 'float32' или 'uint16' (квантованные координаты, вдвое меньше
+    трафика), keyframe_every - как часто слать ключевой кадр всем, fps - сколько
+    шагов в секунду считать (None - так быстро, как получается), steps - сколько
+    шагов считать (None - пока не остановят).
+    """
+
+    def __init__(self, population, host='127.0.0.1', tcp_port=8765, ws_port=None,
+                 positions='float32', keyframe_every=100, fps=None, steps=None):
+        if positions not in POSITION_FORMATS:
+            raise ValueError(f"Формат координат: {', '.join(POSITION_FORMATS)}")
+        self.population = population
+        self.host = host
+        self.tcp_port = tcp_port
+        self.ws_port = ws_port
+        self.positions = positions
+        self.keyframe_every = keyframe_every
+        self.fps = fps
+        self.steps = steps
+        self.close_timeout = 5.0
+        self.clients = set()
+        self._servers = []
+        self._previous_status = None
+
+    def _encode(self):
+        """Кадр текущего состояния популяции"""
+        population = self.population
+        status = population.status.astype(np.int8)
+        positions = population.positions
+        if self.positions == 'uint16':
+            positions = quantize_positions(positions)
+        else:
+            positions = positions.astype(np.float32, copy=False)
+
+        changed = None
+        if self._previous_status is not None:
+            changed = np.flatnonzero(status != self._previous_status)
+        self._previous_status = status
+        keyframe = changed is None or population.time % self.keyframe_every == 0
+        counts = getattr(population, 'counts', None)
+        if counts is None:
+            counts = population.census()
+        return _Frame(population.time, counts, population.quarantine_active, positions, status,
+                      changed, POSITION_FORMATS[self.positions], keyframe)
+
+    def _step(self):
+        self.population.step()
+        return self._encode()
+
+    async def _serve_client(self, reader, writer, websocket):
+        if websocket and not await _ws_handshake(reader, writer):
+            writer.close()
+            return
+        send = _ws_send if websocket else _tcp_send
+        client = _Client(lambda payload: send(writer, payload))
+        self.clients.add(client)
+        pump = asyncio.create_task(client.pump())
+        # Клиент отключился - читающая сторона видит EOF; закончились кадры - pump выходит
+        listen = asyncio.create_task(_ws_read_until_close(reader, writer) if websocket else reader.read())
+        try:
+            await asyncio.wait({pump, listen}, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            self.clients.discard(client)
+            for task in (pump, listen):
+                task.cancel()
+            await asyncio.gather(pump, listen, return_exceptions=True)
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except (ConnectionError, OSError):
+                pass
+
+    async def start(self):
+        if self.tcp_port is not None:
+            self._servers.append(await asyncio.start_server(
+                lambda r, w: self._serve_client(r, w, False), self.host, self.tcp_port))
+        if self.ws_port is not None:
+            self._servers.append(await asyncio.start_server(
+                lambda r, w: self._serve_client(r, w, True), self.host, self.ws_port))
+
+    @property
+    def ports(self):
+        """Фактические порты (если в конструкторе был 0, система выбирает свободный)"""
+        return [server.sockets[0].getsockname()[1] for server in self._servers]
+
+    async def simulate(self):
+        """Цикл модели: шаг считается в отдельном потоке, чтобы отправка кадров шла параллельно"""
+        loop = asyncio.get_running_loop()
+        step = 0
+        while self.steps is None or step < self.steps:
+            started = time.perf_counter()
+            frame = await loop.run_in_executor(None, self._step)
+            for client in self.clients:
+                client.offer(frame)
+            step += 1
+            delay = 0.0
+            if self.fps:
+                delay = max(0.0, 1.0 / self.fps - (time.perf_counter() - started))
+            await asyncio.sleep(delay)
+
+    async def serve(self):
+        await self.start()
+        try:
+            await self.simulate()
+            # Досылаем клиентам последние кадры и закрываем соединения
+            # (зависшего клиента ждем не дольше close_timeout секунд)
+            for client in list(self.clients):
+                client.close()
+            deadline = time.perf_counter() + self.close_timeout
+            while self.clients and time.perf_counter() < deadline:
+                await asyncio.sleep(0.01)
+        finally:
+            for server in self._servers:
+                server.close()
+                await server.wait_closed()
+
+    def run(self):
+        asyncio.run(self.serve())
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Трансляция симуляции по TCP/WebSocket")
+    parser.add_argument('--size', type=int, default=1000)
+    parser.add_argument('--initial-infected', type=int, default=10)
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--tcp-port', type=int, default=8765)
+    parser.add_argument('--ws-port', type=int, default=8766)
+    parser.add_argument('--positions', choices=sorted(POSITION_FORMATS), default='float32')
+    parser.add_argument('--keyframe-every', type=int, default=100)
+    parser.add_argument('--fps', type=float, default=30)
+    parser.add_argument('--steps', type=int, default=None)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    population = Population(size=args.size, initial_infected=args.initial_infected,
+                            rng=args.seed, verbose=False)
+    server = SimulationServer(population, host=args.host, tcp_port=args.tcp_port, ws_port=args.ws_port,
+                              positions=args.positions, keyframe_every=args.keyframe_every,
+                              fps=args.fps, steps=args.steps)
+    try:
+        server.run()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,179 @@
+# Пространственный индекс для поиска контактов
+# Единичный квадрат режется на клетки размером не меньше радиуса взаимодействия,
+# поэтому все соседи агента лежат в его клетке или в 8 соседних
+
+import numpy as np
+
+# Смещения соседних клеток (включая саму клетку)
+NEIGHBOR_OFFSETS = [(dx, dy) for dx in (-1, 0, 1) for dy in (-1, 0, 1)]
+# Сколько точек-запросов обрабатывается за раз и примерно сколько пар отдается
+# одним куском (на кусок уходит порядка 60 байт на пару, то есть ~16 МБ)
+QUERY_BLOCK = 1 << 16
+MAX_BLOCK_PAIRS = 1 << 18
+
+
+class CellGrid:
+    """Равномерная сетка клеток над единичным квадратом"""
+
+    def __init__(self, radius):
+        self.radius = radius
+        # Клеток столько, чтобы сторона клетки была >= радиуса
+        self.n_cells = max(1, int(1.0 / radius)) if radius > 0 else 1
+
+    def cells(self, positions):
+        """Целочисленные координаты клеток для массива позиций (n, 2)"""
+        cells = (positions * self.n_cells).astype(np.int64)
+        np.clip(cells, 0, self.n_cells - 1, out=cells)
+        return cells
+
+    def keys(self, cx, cy, groups=None):
+        """Номер клетки; группы (реплики, регионы) не пересекаются между собой"""
+        keys = cx * self.n_cells + cy
+        if groups is not None:
+            keys = keys + groups.astype(np.int64) * (self.n_cells * self.n_cells)
+        return keys
+
+    def point_keys(self, positions, groups=None):
+        """Номера клеток для массива позиций (n, 2)"""
+        cells = self.cells(positions)
+        return self.keys(cells[:, 0], cells[:, 1], groups)
+
+    def candidate_blocks(self, a_pos, b_pos, a_groups=None, b_groups=None, max_pairs=MAX_BLOCK_PAIRS):
+        """Пары (a, b) из соседних клеток - кандидаты на контакт, кусками.
+
+        Точки b сортируются по номеру клетки, а для каждой точки a через
+        searchsorted находится диапазон точек b в каждой из 9 соседних клеток.
+        Сортируется всегда большее множество: поиск по нему для маленького
+        множества (например, нескольких инфицированных) намного дешевле.
+        Точки a тоже идут в порядке номеров клеток: сдвиг на соседнюю клетку
+        прибавляет к номеру константу, так что запросы searchsorted отсортированы
+        и идут по памяти подряд (на миллионах точек случайные запросы в разы
+        медленнее из-за промахов кэша).
+
+        Пар бывает на порядки больше, чем точек (при 10% зараженных на миллионе
+        агентов - сотни миллионов), поэтому они не собираются в один массив:
+        запросы берутся блоками по QUERY_BLOCK точек, и каждый блок отдается
+        кусками примерно по max_pairs пар. Память на шаг от числа пар не зависит.
+        Выдает пары индексов в a_pos и b_pos (порядок пар не определен).
+        """
+        if len(a_pos) == 0 or len(b_pos) == 0:
+            return
+        if len(a_pos) > len(b_pos):
+            # Соседство симметрично, так что можно поменять множества местами
+            for ib, ia in self.candidate_blocks(b_pos, a_pos, b_groups, a_groups, max_pairs):
+                yield ia, ib
+            return
+
+        b_keys = self.point_keys(b_pos, b_groups)
+        order = np.argsort(b_keys, kind='stable')
+        sorted_keys = b_keys[order]
+        del b_keys
+        a_order = np.argsort(self.point_keys(a_pos, a_groups), kind='stable')
+
+        for first in range(0, len(a_order), QUERY_BLOCK):
+            a_index = a_order[first:first + QUERY_BLOCK]
+            a_cells = self.cells(a_pos[a_index])
+            a_block_groups = a_groups[a_index] if a_groups is not None else None
+            for dx, dy in NEIGHBOR_OFFSETS:
+                nx = a_cells[:, 0] + dx
+                ny = a_cells[:, 1] + dy
+                valid = (nx >= 0) & (nx < self.n_cells) & (ny >= 0) & (ny < self.n_cells)
+                if not np.any(valid):
+                    continue
+                groups = a_block_groups[valid] if a_block_groups is not None else None
+                keys = self.keys(nx[valid], ny[valid], groups)
+
+                lo = np.searchsorted(sorted_keys, keys, side='left')
+                counts = np.searchsorted(sorted_keys, keys, side='right') - lo
+                yield from _expand(a_index[valid], lo, counts, order, max_pairs)
+
+    def candidate_pairs(self, a_pos, b_pos, a_groups=None, b_groups=None):
+        """Все пары-кандидаты одним массивом (см. candidate_blocks)"""
+        return _concatenate(self.candidate_blocks(a_pos, b_pos, a_groups, b_groups))
+
+    def cell_index(self, positions):
+        """Индекс точек по клеткам: номера точек в порядке клеток и начало каждой
+        клетки в этом порядке (клетка c - это order[starts[c]:starts[c + 1]]).
+        Без групп: таблица на n_cells^2 клеток, поиск соседей без searchsorted."""
+        keys = self.point_keys(positions)
+        order = np.argsort(keys, kind='stable')
+        starts = np.zeros(self.n_cells * self.n_cells + 1, dtype=np.int64)
+        np.cumsum(np.bincount(keys, minlength=self.n_cells * self.n_cells), out=starts[1:])
+        return order, starts
+
+    def table_pairs(self, a_pos, b_pos, b_index, max_pairs=MAX_BLOCK_PAIRS):
+        """Пары (a, b) ближе радиуса кусками, b_index = cell_index(b_pos).
+
+        a - это обычно кусок большого множества: память зависит только от
+        размера куска, max_pairs и b, а не от того, сколько всего точек.
+        """
+        if len(a_pos) == 0 or len(b_pos) == 0:
+            return
+        order, starts = b_index
+        r2 = self.radius * self.radius
+        a_cells = self.cells(a_pos)
+        queries = np.arange(len(a_pos))
+        for dx, dy in NEIGHBOR_OFFSETS:
+            nx = a_cells[:, 0] + dx
+            ny = a_cells[:, 1] + dy
+            valid = (nx >= 0) & (nx < self.n_cells) & (ny >= 0) & (ny < self.n_cells)
+            if not np.any(valid):
+                continue
+            keys = self.keys(nx[valid], ny[valid])
+            lo = starts[keys]
+            for ia, ib in _expand(queries[valid], lo, starts[keys + 1] - lo, order, max_pairs):
+                diff = a_pos[ia] - b_pos[ib]
+                close = np.einsum('ij,ij->i', diff, diff) < r2
+                yield ia[close], ib[close]
+
+    def pair_blocks(self, a_pos, b_pos, a_groups=None, b_groups=None, max_pairs=MAX_BLOCK_PAIRS):
+        """Пары (a, b), расстояние между которыми меньше радиуса, кусками"""
+        r2 = self.radius * self.radius
+        for ia, ib in self.candidate_blocks(a_pos, b_pos, a_groups, b_groups, max_pairs):
+            diff = a_pos[ia] - b_pos[ib]
+            close = np.einsum('ij,ij->i', diff, diff) < r2
+            yield ia[close], ib[close]
+
+    def pairs_within(self, a_pos, b_pos, a_groups=None, b_groups=None):
+        """Пары (a, b), расстояние между которыми меньше радиуса, одним массивом"""
+        return _concatenate(self.pair_blocks(a_pos, b_pos, a_groups, b_groups))
+
+    def contact_counts(self, a_pos, b_pos, a_groups=None, b_groups=None):
+        """Для каждой точки a - сколько точек b ближе радиуса.
+
+        Считается по кускам pair_blocks, так что сами пары в памяти целиком не лежат.
+        """
+        counts = np.zeros(len(a_pos), dtype=np.int64)
+        for ia, _ in self.pair_blocks(a_pos, b_pos, a_groups, b_groups):
+            counts += np.bincount(ia, minlength=len(a_pos))
+        return counts
+
+
+def _expand(queries, lo, counts, order, max_pairs):
+    """Разворачивает диапазоны order[lo:lo + counts] запросов queries в пары кусками.
+
+    Запросы режутся так, чтобы в куске было не больше max_pairs пар (плюс пары
+    одного запроса, на котором порог перешли).
+    """
+    ends = np.cumsum(counts)
+    total = int(ends[-1]) if len(ends) else 0
+    if total == 0:
+        return
+    cuts = np.searchsorted(ends, np.arange(max_pairs, total, max_pairs), side='left') + 1
+    bounds = np.unique(np.concatenate(([0], cuts, [len(counts)])))
+    for q0, q1 in zip(bounds[:-1], bounds[1:]):
+        run = counts[q0:q1]
+        size = int(run.sum())
+        if size == 0:
+            continue
+        starts = np.repeat(lo[q0:q1] - (np.cumsum(run) - run), run)
+        starts += np.arange(size)
+        yield np.repeat(queries[q0:q1], run), order[starts]
+
+
+def _concatenate(blocks):
+    pairs = list(blocks)
+    if not pairs:
+        empty = np.zeros(0, dtype=np.int64)
+        return empty, empty
+    return np.concatenate([ia for ia, _ in pairs]), np.concatenate([ib for _, ib in pairs])
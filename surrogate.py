@@ -0,0 +1,232 @@
+# Быстрая приближенная модель SIRV (среднее поле) для вопросов "что если"
+# Вместо агентов - четыре числа S, I, R, V, которые меняются по тем же правилам,
+# что и в Population.step: болезнь длится recovery_time шагов, иммунитет -
+# immunity_time, карантин с гистерезисом (вводится на пороге, снимается на
+# половине порога), вакцинация vaccination_rate человек за шаг с vaccination_start.
+# Заражение - среднее поле: восприимчивый встречает в среднем
+# beta * I / N зараженных и заражается с вероятностью 1 - exp(-beta * I / N).
+#
+# Все параметры можно передавать массивами - тогда за один проход считаются
+# тысячи сценариев сразу. Эффективная частота контактов (contact_scale) и
+# ослабление контактов в карантине (quarantine_factor) подбираются по ансамблю
+# агентных прогонов (calibrate), там же считается, насколько модель от них отходит.
+
+import inspect
+import numpy as np
+from population import Population
+from ensemble import run_ensemble
+
+# Параметры Population, от которых зависит приближенная модель
+MODEL_PARAMS = ('size', 'initial_infected', 'infection_rate', 'recovery_time', 'immunity_time',
+                'interaction_radius', 'quarantine_enabled', 'quarantine_threshold',
+                'vaccination_enabled', 'vaccination_start', 'vaccination_rate')
+_DEFAULTS = {name: param.default for name, param in inspect.signature(Population.__init__).parameters.items()
+             if name in MODEL_PARAMS}
+
+# В начале люди стоят в четырех квадратах 0.4 x 0.4, то есть занимают 0.64 площади
+OCCUPIED_AREA = 0.64
+
+# Сетка для подбора: contact_scale в логарифмическом масштабе, quarantine_factor линейно
+_SCALE_GRID = np.geomspace(0.05, 5.0, 48)
+_FACTOR_GRID = np.linspace(0.05, 1.0, 20)
+
+
+def base_contact_rate(size, infection_rate, interaction_radius):
+    """Начальное приближение beta: ожидаемое число заражающих контактов с
+    зараженными при I = N (p * площадь круга контакта * плотность)"""
+    return infection_rate * np.pi * interaction_radius ** 2 * size / OCCUPIED_AREA
+
+
+def simulate(steps, contact_scale=1.0, quarantine_factor=0.3, **params):
+    """Прогон приближенной модели на steps шагов.
+
+    params - аргументы Population (лишние вроде movement_speed игнорируются),
+    любые из них и contact_scale/quarantine_factor могут быть массивами одной
+    формы (или приводимыми к ней): каждый элемент - отдельный сценарий.
+    Возвращает (steps, 4) для одного сценария или (steps, *форма, 4) для массива
+    сценариев; столбцы S, I, R, V, как в истории Population (дробные числа).
+    """
+    values = {**_DEFAULTS, **{k: v for k, v in params.items() if k in MODEL_PARAMS}}
+    names = MODEL_PARAMS + ('contact_scale', 'quarantine_factor')
+    values.update(contact_scale=contact_scale, quarantine_factor=quarantine_factor)
+    arrays = np.broadcast_arrays(*(np.asarray(values[name], dtype=np.float64) for name in names))
+    shape = arrays[0].shape
+    p = {name: array.ravel() for name, array in zip(names, arrays)}
+    k = len(p['size'])
+    rows = np.arange(k)
+
+    size = p['size']
+    beta = p['contact_scale'] * base_contact_rate(size, p['infection_rate'], p['interaction_radius'])
+    beta_quarantine = beta * p['quarantine_factor']
+    threshold = p['quarantine_threshold'] / 100
+    quarantine_enabled = p['quarantine_enabled'].astype(bool)
+    vaccination_enabled = p['vaccination_enabled'].astype(bool)
+
+    # Когорты по шагу выхода из состояния (как календарь событий у Population):
+    # заразившийся на шаге t выздоравливает на шаге t + max(recovery_time - 1, 0),
+    # выздоровевший на шаге u теряет иммунитет на шаге u + max(immunity_time - 1, 0)
+    recovery_delay = np.maximum(p['recovery_time'].astype(np.int64) - 1, 0)
+    immunity_delay = np.maximum(p['immunity_time'].astype(np.int64) - 1, 0)
+    horizon = int(max(recovery_delay.max(), immunity_delay.max())) + 2
+    recovering = np.zeros((k, horizon))
+    waning = np.zeros((k, horizon))
+
+    infected = p['initial_infected'].copy()
+    susceptible = size - infected
+    recovered = np.zeros(k)
+    vaccinated = np.zeros(k)
+    # Начальные зараженные выздоравливают на шаге max(recovery_time, 1)
+    recovering[rows, np.maximum(p['recovery_time'].astype(np.int64), 1) % horizon] += infected
+    quarantine_active = np.zeros(k, dtype=bool)
+
+    out = np.empty((steps, k, 4))
+    for t in range(1, steps + 1):
+        slot = t % horizon
+        # Карантин по доле зараженных в начале шага
+        fraction = infected / size
+        start = quarantine_enabled & ~quarantine_active & (fraction >= threshold)
+        stop = quarantine_active & (fraction < threshold * 0.5)
+        quarantine_active = (quarantine_active | start) & ~stop
+
+        # Заражение
+        contacts = np.where(quarantine_active, beta_quarantine, beta) * fraction
+        new = susceptible * -np.expm1(-contacts)
+        susceptible -= new
+        infected += new
+        recovering[rows, (t + recovery_delay) % horizon] += new
+
+        # Выздоровление и потеря иммунитета
+        recovered_now = recovering[:, slot].copy()
+        recovering[:, slot] = 0
+        infected -= recovered_now
+        recovered += recovered_now
+        waning[rows, (t + immunity_delay) % horizon] += recovered_now
+        lost = waning[:, slot].copy()
+        waning[:, slot] = 0
+        recovered -= lost
+        susceptible += lost
+        # Когорты вычитаются из сумм, и ошибки округления могут увести число
+        # зараженных чуть ниже нуля, а отрицательные "зараженные" дальше
+        # раскручивали бы отрицательное заражение
+        np.maximum(infected, 0.0, out=infected)
+        np.maximum(recovered, 0.0, out=recovered)
+
+        # Вакцинация
+        vaccinating = vaccination_enabled & (t >= p['vaccination_start'])
+        vaccinated_now = np.where(vaccinating, np.minimum(p['vaccination_rate'], susceptible), 0.0)
+        susceptible -= vaccinated_now
+        vaccinated += vaccinated_now
+
+        out[t - 1, :, 0] = susceptible
+        out[t - 1, :, 1] = infected
+        out[t - 1, :, 2] = recovered
+        out[t - 1, :, 3] = vaccinated
+    return out.reshape((steps,) + shape + (4,))
+
+
+def _summary(curves):
+    """Пик зараженных и его время по кривым (..., steps, 4)"""
+    infected = curves[..., 1]
+    peak = np.argmax(infected, axis=-1)
+    return np.take_along_axis(infected, peak[..., np.newaxis], axis=-1)[..., 0], peak + 1
+
+
+def deviation_report(points, targets, predictions):
+    """Отклонение приближенной модели от агентной по каждой точке калибровки.
+
+    targets и predictions - кривые (steps, 4): средние по агентным прогонам и
+    приближенные. RMSE считается в долях населения.
+    """
+    report = []
+    for point, target, prediction in zip(points, targets, predictions):
+        size = point.get('size', _DEFAULTS['size'])
+        error = (prediction - target) / size
+        agent_peak, agent_time = _summary(target)
+        model_peak, model_time = _summary(prediction)
+        report.append({
+            **{name: point.get(name, _DEFAULTS[name]) for name in MODEL_PARAMS},
+            'rmse': float(np.sqrt(np.mean(error ** 2))),
+            'rmse_infected': float(np.sqrt(np.mean(error[:, 1] ** 2))),
+            'peak_infected': float(agent_peak),
+            'surrogate_peak_infected': float(model_peak),
+            'time_to_peak': int(agent_time),
+            'surrogate_time_to_peak': int(model_time),
+        })
+    return report
+
+
+class Surrogate:
+    """Откалиброванная приближенная модель.
+
+    report - отклонения от агентной модели на точках калибровки (список
+    словарей, можно отдать в sweep.write_table).
+    """
+
+    def __init__(self, contact_scale=1.0, quarantine_factor=0.3, report=None):
+        self.contact_scale = contact_scale
+        self.quarantine_factor = quarantine_factor
+        self.report = report or []
+
+    def run(self, steps, **params):
+        """Сценарий или массив сценариев (см. simulate)"""
+        return simulate(steps, contact_scale=self.contact_scale,
+                        quarantine_factor=self.quarantine_factor, **params)
+
+    def __repr__(self):
+        return f"Surrogate(contact_scale={self.contact_scale:.4g}, quarantine_factor={self.quarantine_factor:.3g})"
+
+
+def _fit_error(points, targets, steps, scales, factors):
+    """Средняя квадратичная ошибка (в долях населения) для всех пар (scale, factor).
+
+    Все пары и все точки считаются одним векторным прогоном.
+    """
+    scale, factor = np.meshgrid(scales, factors, indexing='ij')
+    errors = np.zeros(scale.shape)
+    for point, target in zip(points, targets):
+        curves = simulate(steps, contact_scale=scale, quarantine_factor=factor, **point)
+        size = point.get('size', _DEFAULTS['size'])
+        diff = (curves - target[:, np.newaxis, np.newaxis, :]) / size
+        errors += np.mean(diff ** 2, axis=(0, 3))
+    return errors / len(points)
+
+
+def fit(points, targets, steps, rounds=3):
+    """Подбирает contact_scale и quarantine_factor по кривым targets.
+
+    Сначала перебор по грубой сетке, потом несколько раз сетка сужается вокруг
+    лучшей точки. Если ни в одной точке нет карантина, quarantine_factor не
+    влияет на результат и остается 0.3.
+    """
+    with_quarantine = any(point.get('quarantine_enabled', _DEFAULTS['quarantine_enabled']) for point in points)
+    scales = _SCALE_GRID
+    factors = _FACTOR_GRID if with_quarantine else np.array([0.3])
+    for _ in range(rounds + 1):
+        errors = _fit_error(points, targets, steps, scales, factors)
+        i, j = np.unravel_index(np.argmin(errors), errors.shape)
+        best_scale, best_factor = scales[i], factors[j]
+        # Следующий раунд - сетка между соседями лучшей точки
+        scales = np.geomspace(scales[max(i - 1, 0)], scales[min(i + 1, len(scales) - 1)], 16)
+        if with_quarantine:
+            factors = np.linspace(factors[max(j - 1, 0)], factors[min(j + 1, len(factors) - 1)], 8)
+    return float(best_scale), float(best_factor)
+
+
+def calibrate(points, replicas=32, steps=900, seed=0, workers=None):
+    """Калибровка по агентной модели.
+
+    points - точка (словарь аргументов Population) или список точек. Для каждой
+    считается ансамбль из replicas агентных прогонов, и параметры приближенной
+    модели подбираются сразу по средним кривым всех точек. Возвращает Surrogate
+    с отчетом об отклонениях.
+    """
+    if isinstance(points, dict):
+        points = [points]
+    targets = [run_ensemble(point, replicas=replicas, steps=steps, seed=seed, workers=workers,
+                            quantiles=()).mean
+               for point in points]
+    contact_scale, quarantine_factor = fit(points, targets, steps)
+    surrogate = Surrogate(contact_scale, quarantine_factor)
+    predictions = [surrogate.run(steps, **point) for point in points]
+    surrogate.report = deviation_report(points, targets, predictions)
+    return surrogate
@@ -0,0 +1,234 @@
+# Перебор параметров модели (свип) с кэшем результатов на диске
+# Каждая точка (параметры, seed, число шагов, версия движка) считается один раз:
+# результат кладется в кэш по хэшу содержимого, и повторные или пересекающиеся
+# свипы считают только новые точки.
+
+import csv
+import hashlib
+import inspect
+import itertools
+import json
+import os
+import sys
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from population import Population, ENGINE_VERSION
+
+# Показатели, которые считаются для каждого прогона
+METRICS = ('peak_infected', 'time_to_peak', 'total_infections', 'quarantine_days')
+
+# Параметры, которые можно перебирать (аргументы Population.__init__)
+SWEEPABLE = tuple(
+    name for name in inspect.signature(Population.__init__).parameters
+    if name not in ('self', 'rng', 'verbose', 'history_size', 'stats', 'events')
+)
+
+
+def _check_names(names):
+    unknown = set(names) - set(SWEEPABLE)
+    if unknown:
+        raise ValueError(f"Неизвестные параметры Population: {', '.join(sorted(unknown))}")
+
+
+def grid_points(space):
+    """Все комбинации значений: space = {'infection_rate': [0.2, 0.4], ...}"""
+    _check_names(space)
+    names = list(space)
+    return [dict(zip(names, values)) for values in itertools.product(*space.values())]
+
+
+def random_points(space, samples, seed=0):
+    """samples случайных точек.
+
+    Значение в space - это либо список (выбирается один из вариантов), либо
+    пара (low, high): для целых чисел берется целое из [low, high], иначе
+    равномерно из [low, high).
+    """
+    _check_names(space)
+    rng = np.random.default_rng(seed)
+    points = []
+    for _ in range(samples):
+        point = {}
+        for name, values in space.items():
+            if isinstance(values, tuple) and len(values) == 2:
+                low, high = values
+                if isinstance(low, int) and isinstance(high, int):
+                    point[name] = int(rng.integers(low, high + 1))
+                else:
+                    point[name] = float(rng.uniform(low, high))
+            else:
+                point[name] = values[rng.integers(len(values))]
+        points.append(point)
+    return points
+
+
+def _to_json(value):
+    # numpy-скаляры (например, из np.arange) в обычные питоновские типы
+    return value.item() if isinstance(value, np.generic) else value
+
+
+def _plain(params):
+    return {name: _to_json(value) for name, value in params.items()}
+
+
+def cache_key(params, seed, steps):
+    """Хэш содержимого задачи: параметры, seed, длина прогона и версия движка"""
+    payload = json.dumps({'params': _plain(params), 'seed': _to_json(seed), 'steps': _to_json(steps),
+                          'engine_version': ENGINE_VERSION}, sort_keys=True)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class ResultCache:
+    """Кэш результатов на диске: один маленький JSON-файл на задачу.
+
+    Когда суммарный размер превышает max_bytes, удаляются файлы, к которым
+    дольше всего не обращались (время доступа обновляется при каждом чтении).
+    """
+
+    def __init__(self, directory, max_bytes=64 * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], f"{key}.json")
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                result = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+        os.utime(path)  # отмечаем, что результат еще нужен
+        return result
+
+    def put(self, key, result):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(result, f)
+        os.replace(tmp_path, path)
+
+    def evict(self):
+        """Удаляет самые старые результаты, пока кэш не влезет в max_bytes"""
+        entries = []
+        total = 0
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                path = os.path.join(root, name)
+                stat = os.stat(path)
+                entries.append((stat.st_mtime, stat.st_size, path))
+                total += stat.st_size
+        entries.sort()
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            os.remove(path)
+            total -= size
+        return total
+
+
+def run_point(params, seed, steps):
+    """Один прогон без графики, возвращает показатели METRICS"""
+    population = Population(**params, rng=seed, verbose=False)
+    population.run(steps)
+    return run_metrics(population)
+
+
+def run_metrics(population):
+    """Показатели METRICS для уже посчитанной популяции"""
+    infected = population.history_infected
+    peak = int(np.argmax(infected))
+    return {
+        'peak_infected': int(infected[peak]),
+        'time_to_peak': int(population.history.steps[peak]) + 1,  # номер дня
+        'total_infections': int(population.total_infections),
+        'quarantine_days': int(population.quarantine_days),
+    }
+
+
+def _run_task(task):
+    return run_point(*task)
+
+
+def run_sweep(points, seeds=4, steps=900, base_params=None, workers=None,
+              cache_dir='.sweep_cache', max_cache_bytes=64 * 1024 * 1024):
+    """Считает все точки points для seed = 0..seeds-1 и возвращает таблицу.
+
+    base_params - общие параметры для всех точек (точка их перекрывает).
+    Таблица - список словарей: параметры точки, seed и показатели METRICS.
+    Посчитанные результаты сразу пишутся в кэш, так что прерванный свип
+    продолжится с того же места.
+    """
+    base_params = _plain(base_params or {})
+    _check_names(base_params)
+    cache = ResultCache(cache_dir, max_cache_bytes) if cache_dir else None
+
+    rows = []
+    missing = {}
+    for point in points:
+        point = _plain(point)
+        params = {**base_params, **point}
+        for seed in range(seeds):
+            key = cache_key(params, seed, steps)
+            row = {**point, 'seed': seed}
+            rows.append(row)
+            result = cache.get(key) if cache else None
+            if result is None:
+                missing.setdefault(key, ((params, seed, steps), []))[1].append(row)
+            else:
+                row.update(result)
+
+    def store(key, result):
+        if cache:
+            cache.put(key, result)
+        for row in missing[key][1]:
+            row.update(result)
+
+    tasks = {key: task for key, (task, _) in missing.items()}
+    if workers == 1:
+        for key, task in tasks.items():
+            store(key, _run_task(task))
+    elif tasks:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = {pool.submit(_run_task, task): key for key, task in tasks.items()}
+            for future in as_completed(futures):
+                store(futures[future], future.result())
+
+    if cache:
+        cache.evict()
+    return rows
+
+
+def summarize(rows):
+    """Средние показатели по seed для каждой точки"""
+    groups = {}
+    for row in rows:
+        point = tuple((k, v) for k, v in row.items() if k not in METRICS and k != 'seed')
+        groups.setdefault(point, []).append(row)
+    summary = []
+    for point, group in groups.items():
+        entry = dict(point)
+        entry['seeds'] = len(group)
+        for metric in METRICS:
+            entry[metric] = float(np.mean([row[metric] for row in group]))
+        summary.append(entry)
+    return summary
+
+
+def write_table(rows, path=None):
+    """Пишет таблицу в CSV (в stdout, если path не задан)"""
+    if not rows:
+        return
+    fields = list(rows[0])
+    if path is None:
+        writer = csv.DictWriter(sys.stdout, fieldnames=fields)
+        writer.writeheader()
+        writer.writerows(rows)
+        return
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=fields)
+        writer.writeheader()
+        writer.writerows(rows)
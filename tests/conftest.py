@@ -0,0 +1,5 @@
+# Модули проекта лежат в корне репозитория, а не в пакете
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,30 @@
+# Сохранение и загрузка: продолжение после загрузки совпадает бит в бит
+import numpy as np
+import pytest
+from population import Population
+from checkpoint import save_checkpoint, load_checkpoint, STATE_ARRAYS
+
+
+@pytest.mark.parametrize('params', [
+    {},
+    {'events': True},
+    {'events': False},
+    {'compact': True, 'events': True},
+    {'transitions': 'scan', 'quarantine_enabled': True, 'quarantine_threshold': 5},
+])
+def test_roundtrip(tmp_path, params):
+    path = str(tmp_path / 'check.npz')
+    population = Population(**{'size': 100, 'rng': 1, 'verbose': False, **params})
+    population.run(10)
+    save_checkpoint(population, path)
+    restored = load_checkpoint(path)
+    assert (restored.events is None) == (population.events is None)
+
+    population.run(10)
+    restored.run(10)
+    for name in STATE_ARRAYS:
+        assert np.array_equal(getattr(population, name), getattr(restored, name)), name
+    assert np.array_equal(population.history.data, restored.history.data)
+    if population.events is not None:
+        for name, column in population.events.state().items():
+            assert np.array_equal(column, restored.events.state()[name]), name
@@ -0,0 +1,21 @@
+# Ошибки в таблице [run] сценария - ScenarioError, а не трассировка из Population.run
+import json
+import pytest
+from cli import ScenarioError, parse_args, _prepare
+
+
+def _args(tmp_path, run):
+    path = tmp_path / 'scenario.json'
+    path.write_text(json.dumps({'population': {'size': 50}, 'run': run}), encoding='utf-8')
+    return parse_args(['run', str(path)])
+
+
+@pytest.mark.parametrize('run', [{'on_extinction': 'foo'}, {'steps': '5'}, {'steps': -1}])
+def test_invalid_run_table(tmp_path, run):
+    with pytest.raises(ScenarioError):
+        _prepare(_args(tmp_path, run))
+
+
+def test_valid_run_table(tmp_path):
+    scenario = _prepare(_args(tmp_path, {'on_extinction': 'skip', 'steps': 5}))
+    assert scenario['run'] == {'on_extinction': 'skip', 'steps': 5, 'seed': None}
@@ -0,0 +1,78 @@
+# Разные реализации одной динамики должны давать одно и то же:
+#  - календарь событий и проход по таймерам (transitions) - бит в бит;
+#  - сетка клеток и эталонный двойной цикл (engine) - статистически: случайные
+#    числа они тянут по-разному, но вероятность заражения одна и та же.
+# Отдельно проверяются короткие болезнь и иммунитет (0 и 1 шаг): на них легче
+# всего ошибиться на единицу в таймерах.
+import numpy as np
+import pytest
+from population import Population, Status
+from spatial import CellGrid
+
+TIMES = [(0, 0), (0, 1), (1, 0), (1, 1), (2, 1), (7, 3)]
+
+
+@pytest.mark.parametrize('engine', ['grid', 'loop'])
+@pytest.mark.parametrize('recovery_time, immunity_time', TIMES + [(40, 30)])
+@pytest.mark.parametrize('compact', [False, True])
+def test_calendar_matches_scan(engine, recovery_time, immunity_time, compact):
+    params = dict(size=300, initial_infected=10, recovery_time=recovery_time, immunity_time=immunity_time,
+                  engine=engine, compact=compact, quarantine_enabled=True, quarantine_threshold=5,
+                  vaccination_enabled=True, vaccination_start=20, rng=5, verbose=False)
+    calendar = Population(transitions='calendar', **params).run(60)
+    scan = Population(transitions='scan', **params).run(60)
+
+    assert np.array_equal(calendar.history.data, scan.history.data)
+    assert np.array_equal(calendar.status, scan.status)
+    assert np.array_equal(calendar.positions, scan.positions)
+    assert calendar.quarantine_days == scan.quarantine_days
+    # Таймеры что-то значат только у зараженных и выздоровевших
+    calendar.sync_timers()
+    active = (scan.status == Status.INFECTED.value) | (scan.status == Status.RECOVERED.value)
+    assert np.array_equal(calendar.timers[active], scan.timers[active])
+
+
+@pytest.mark.parametrize('radius', [0.03, 0.07, 0.3])
+def test_grid_contacts_match_brute_force(radius):
+    rng = np.random.default_rng(0)
+    a = rng.random((500, 2))
+    b = rng.random((80, 2))
+    distances = np.linalg.norm(a[:, np.newaxis] - b[np.newaxis], axis=2)
+    expected = (distances < radius).sum(axis=1)
+
+    grid = CellGrid(radius)
+    assert np.array_equal(grid.contact_counts(a, b), expected)
+    k = np.zeros(len(a), dtype=np.int64)
+    for ia, _ in grid.table_pairs(a, b, grid.cell_index(b)):
+        k += np.bincount(ia, minlength=len(a))
+    assert np.array_equal(k, expected)
+
+
+def _ensemble(engine, recovery_time, immunity_time, runs=24):
+    """Всего заражений и пик зараженных по runs прогонам с разными зернами.
+
+    Плотно и с низкой вероятностью заражения, чтобы у восприимчивых часто было
+    несколько контактов сразу: так видна ошибка в 1 - (1 - p)^k.
+    """
+    totals, peaks = [], []
+    for seed in range(runs):
+        population = Population(size=200, initial_infected=30, interaction_radius=0.08, infection_rate=0.1,
+                                recovery_time=recovery_time, immunity_time=immunity_time,
+                                engine=engine, rng=seed, verbose=False).run(20)
+        totals.append(population.total_infections)
+        peaks.append(population.history_infected.max())
+    return np.array(totals, dtype=float), np.array(peaks, dtype=float)
+
+
+def _close(x, y):
+    """Средние совпадают в пределах 4 стандартных ошибок разности"""
+    error = np.sqrt(x.var(ddof=1) / len(x) + y.var(ddof=1) / len(y))
+    return abs(x.mean() - y.mean()) <= 4 * error + 1e-9
+
+
+@pytest.mark.parametrize('recovery_time, immunity_time', TIMES)
+def test_grid_matches_loop(recovery_time, immunity_time):
+    grid = _ensemble('grid', recovery_time, immunity_time)
+    loop = _ensemble('loop', recovery_time, immunity_time)
+    for x, y in zip(grid, loop):
+        assert _close(x, y), (x.mean(), y.mean())
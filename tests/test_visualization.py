@@ -0,0 +1,21 @@
+# Линия карантина на итоговом графике: журнал мер и пересчет по истории согласованы
+import matplotlib
+matplotlib.use('Agg')
+from matplotlib.figure import Figure
+import pytest
+from population import Population
+from visualization import SimulationVisualizer
+
+
+@pytest.mark.parametrize('seed', [1, 2, 3])
+def test_quarantine_starts_agree(seed):
+    params = dict(size=400, initial_infected=5, quarantine_enabled=True, quarantine_threshold=5,
+                  recovery_time=20, immunity_time=10, rng=seed, verbose=False)
+    logged = Population(events=True, **params).run(150)
+    plain = Population(**params).run(150)
+    assert len(logged.events.policy_steps('quarantine_start')) > 0
+
+    t = logged.history.steps
+    from_log = SimulationVisualizer(logged, figure=Figure()).quarantine_starts(t)
+    rescanned = SimulationVisualizer(plain, figure=Figure()).quarantine_starts(t)
+    assert [int(x) for x in from_log] == [int(x) for x in rescanned]
@@ -0,0 +1,349 @@
+# Многоядерный движок с разбиением пространства на тайлы
+# Единичный квадрат режется на прямоугольные тайлы, по одному на процесс.
+# Массивы агентов лежат в multiprocessing.shared_memory, каждый процесс двигает
+# и заражает только "своих" агентов, а инфицированных из соседних тайлов видит
+# через полосу (halo) шириной interaction_radius вдоль границы тайла.
+#
+# Шаг идет в две фазы с барьером между ними:
+#   1. движение своих агентов, список уходящих в другие тайлы и список
+#      своих инфицированных (до заражений этого шага);
+#   2. прием пришедших агентов, заражение по инфицированным из тайла и halo,
+#      переходы между статусами, подсчет S/I/R/V по тайлу.
+# Карантин и вакцинация - глобальные решения, их делает главный процесс между шагами.
+
+import multiprocessing as mp
+from multiprocessing import shared_memory
+import numpy as np
+from population import Status, QUADRANT_OFFSETS, DTYPES, PolicyMixin
+from spatial import CellGrid
+from history import History
+
+# Команды для рабочих процессов
+_STOP, _STEP = 0, 1
+# Столбцы отчета рабочего: сколько агентов, ушло, инфицированных, S, I, R, V, новых заражений
+_LOCAL, _EMIGRANTS, _INFECTED, _COUNTS, _NEW = 0, 1, 2, slice(3, 7), 7
+
+
+def _tile_shape(workers):
+    """Разбиение на tx x ty тайлов, по возможности близкое к квадратному"""
+    tx = int(np.sqrt(workers))
+    while workers % tx:
+        tx -= 1
+    return tx, workers // tx
+
+
+def _tile_of(positions, tx, ty):
+    ix = np.minimum((positions[:, 0] * tx).astype(np.int64), tx - 1)
+    iy = np.minimum((positions[:, 1] * ty).astype(np.int64), ty - 1)
+    return ix * ty + iy
+
+
+def _tile_box(tile, tx, ty):
+    ix, iy = divmod(tile, ty)
+    return ix / tx, (ix + 1) / tx, iy / ty, (iy + 1) / ty
+
+
+def _attach(spec):
+    """Подключается к общим блокам памяти по их описанию"""
+    blocks, arrays = [], {}
+    for name, (shm_name, shape, dtype) in spec.items():
+        shm = shared_memory.SharedMemory(name=shm_name)
+        blocks.append(shm)
+        arrays[name] = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+    return blocks, arrays
+
+
+def _worker(tile, spec, params, seed, start, middle, end):
+    """Рабочий процесс одного тайла"""
+    blocks, a = _attach(spec)
+    S, I, R = Status.SUSCEPTIBLE.value, Status.INFECTED.value, Status.RECOVERED.value
+    rng = np.random.default_rng(seed)
+    tx, ty = params['tile_shape']
+    workers = tx * ty
+    radius = params['interaction_radius']
+    grid = CellGrid(radius)
+    positions, velocities = a['positions'], a['velocities']
+    status, timers = a['status'], a['timers']
+    reports = a['reports']
+
+    # Соседние тайлы, чьи агенты могут оказаться в нашей полосе halo
+    x0, x1, y0, y1 = _tile_box(tile, tx, ty)
+    neighbors = [v for v in range(workers)
+                 if _tile_box(v, tx, ty)[0] <= x1 + radius and _tile_box(v, tx, ty)[1] >= x0 - radius
+                 and _tile_box(v, tx, ty)[2] <= y1 + radius and _tile_box(v, tx, ty)[3] >= y0 - radius]
+
+    own = np.flatnonzero(_tile_of(positions, tx, ty) == tile)
+    reports[tile, _LOCAL] = len(own)
+    end.wait()
+
+    try:
+        while True:
+            start.wait()
+            command, speed = a['control'][0], a['control'][1]
+            if command == _STOP:
+                break
+            offset = a['offsets'][tile]
+
+            # Фаза 1: движение (то же, что в Population.step, но только для своих)
+            pos = positions[own]
+            vel = velocities[own]
+            pos += vel
+            vel[(pos <= 0) | (pos >= 1)] *= -1
+            np.clip(pos, 0, 1, out=pos)
+            vel += (rng.random(vel.shape, dtype=vel.dtype) - 0.5) * 0.002
+            speeds = np.sqrt(np.einsum('ij,ij->i', vel, vel))
+            too_fast = speeds > speed * 1.5
+            if np.any(too_fast):
+                vel[too_fast] *= (speed * 1.5 / speeds[too_fast])[:, np.newaxis]
+            positions[own] = pos
+            velocities[own] = vel
+
+            # Свои инфицированные (с учетом уходящих) - их увидят соседи через halo
+            infected = own[status[own] == I]
+            a['infected'][offset:offset + len(infected)] = infected
+            reports[tile, _INFECTED] = len(infected)
+
+            # Уходящие в другие тайлы
+            new_tiles = _tile_of(pos, tx, ty)
+            leaving = new_tiles != tile
+            emigrants = own[leaving]
+            a['outbox'][offset:offset + len(emigrants)] = emigrants
+            a['outdest'][offset:offset + len(emigrants)] = new_tiles[leaving]
+            reports[tile, _EMIGRANTS] = len(emigrants)
+            own = own[~leaving]
+
+            middle.wait()
+
+            # Фаза 2: принимаем пришедших от всех тайлов
+            incoming = []
+            for v in range(workers):
+                start_v = a['offsets'][v]
+                stop_v = start_v + reports[v, _EMIGRANTS]
+                arrived = a['outdest'][start_v:stop_v] == tile
+                if np.any(arrived):
+                    incoming.append(a['outbox'][start_v:stop_v][arrived])
+            if incoming:
+                own = np.concatenate([own] + incoming)
+
+            # Инфицированные тайла и полосы halo вокруг него
+            sources = []
+            for v in neighbors:
+                start_v = a['offsets'][v]
+                sources.append(a['infected'][start_v:start_v + reports[v, _INFECTED]])
+            sources = np.concatenate(sources) if sources else np.zeros(0, dtype=np.int64)
+            src_pos = positions[sources]
+            in_halo = ((src_pos[:, 0] >= x0 - radius) & (src_pos[:, 0] <= x1 + radius) &
+                       (src_pos[:, 1] >= y0 - radius) & (src_pos[:, 1] <= y1 + radius))
+            sources = sources[in_halo]
+
+            new_infections = 0
+            susceptible = own[status[own] == S]
+            if len(sources) > 0 and len(susceptible) > 0:
+                contacts = grid.contact_counts(positions[susceptible], positions[sources])
+                exposed = np.nonzero(contacts)[0]
+                if len(exposed) > 0:
+                    p_infection = 1.0 - (1.0 - params['infection_rate']) ** contacts[exposed]
+                    newly_infected = susceptible[exposed[rng.random(len(exposed)) < p_infection]]
+                    status[newly_infected] = I
+                    timers[newly_infected] = params['recovery_time']
+                    new_infections = len(newly_infected)
+
+            # Переходы между статусами (как в режиме 'scan' у Population)
+            st = status[own]
+            tm = timers[own]
+            tm[st == I] -= 1
+            recovering = (st == I) & (tm <= 0)
+            st[recovering] = R
+            tm[recovering] = params['immunity_time']
+            tm[(st == R) & (tm > 0)] -= 1
+            st[(st == R) & (tm <= 0)] = S
+            status[own] = st
+            timers[own] = tm
+
+            reports[tile, _LOCAL] = len(own)
+            reports[tile, _COUNTS] = np.bincount(st, minlength=4)[:4]
+            reports[tile, _NEW] = new_infections
+            end.wait()
+    except BaseException:
+        # Ломаем барьеры, чтобы главный процесс не ждал упавшего рабочего вечно
+        for barrier in (start, middle, end):
+            barrier.abort()
+        raise
+    finally:
+        del positions, velocities, status, timers, reports, a
+        for shm in blocks:
+            shm.close()
+
+
+class TiledPopulation(PolicyMixin):
+    """Population, у которой шаг выполняется на нескольких процессах сразу.
+
+    Параметры те же, что у Population. Случайные числа у каждого тайла свои
+    (SeedSequence(rng).spawn(workers)), поэтому при одинаковом числе процессов
+    прогон полностью воспроизводим. С другим числом процессов кривые совпадают
+    статистически, но не бит в бит. Закрывать через close() или with.
+    """
+
+    def __init__(self, size=200, initial_infected=5, infection_rate=0.3,
+                 recovery_time=150, immunity_time=200, interaction_radius=0.03,
+                 movement_speed=0.01, quarantine_enabled=False, quarantine_threshold=30,
+                 vaccination_enabled=False, vaccination_start=300, vaccination_rate=3,
+                 rng=None, verbose=True, history_size=None, compact=False, workers=None):
+
+        self.size = size
+        self.infection_rate = infection_rate
+        self.recovery_time = recovery_time
+        self.immunity_time = immunity_time
+        self.interaction_radius = interaction_radius
+        self.quarantine_enabled = quarantine_enabled
+        self.quarantine_threshold = quarantine_threshold / 100
+        self.quarantine_active = False
+        self.vaccination_enabled = vaccination_enabled
+        self.vaccination_start = vaccination_start
+        self.vaccination_rate = vaccination_rate
+        self.verbose = verbose
+        self.compact = compact
+        self.workers = workers or mp.cpu_count()
+        self.tile_shape = _tile_shape(self.workers)
+
+        seed = np.random.SeedSequence(rng) if not isinstance(rng, np.random.SeedSequence) else rng
+        master_seed, *tile_seeds = seed.spawn(self.workers + 1)
+        self.rng = np.random.default_rng(master_seed)
+        dtypes = DTYPES[compact]
+
+        # Общие массивы: состояние агентов и буферы обмена между тайлами
+        layout = {
+            'positions': ((size, 2), dtypes['float']),
+            'velocities': ((size, 2), dtypes['float']),
+            'status': ((size,), dtypes['status']),
+            'timers': ((size,), dtypes['timers']),
+            'infected': ((size,), np.int64),
+            'outbox': ((size,), np.int64),
+            'outdest': ((size,), np.int32),
+            'control': ((2,), np.float64),
+            'offsets': ((self.workers,), np.int64),
+            'reports': ((self.workers, 8), np.int64),
+        }
+        self._blocks = []
+        spec = {}
+        arrays = {}
+        for name, (shape, dtype) in layout.items():
+            nbytes = max(int(np.prod(shape)) * np.dtype(dtype).itemsize, 1)
+            shm = shared_memory.SharedMemory(create=True, size=nbytes)
+            self._blocks.append(shm)
+            spec[name] = (shm.name, shape, np.dtype(dtype).str)
+            arrays[name] = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+            arrays[name][...] = 0
+        self._arrays = arrays
+        self.positions = arrays['positions']
+        self.velocities = arrays['velocities']
+        self.status = arrays['status']
+        self.timers = arrays['timers']
+
+        # Начальное состояние - как у Population
+        quadrants = np.arange(size) % 4
+        self.positions[:] = self.rng.random((size, 2)) * 0.4 + QUADRANT_OFFSETS[quadrants]
+        self.velocities[:] = (self.rng.random((size, 2)) - 0.5) * movement_speed
+        first = self.rng.choice(size, initial_infected, replace=False)
+        self.status[first] = Status.INFECTED.value
+        self.timers[first] = recovery_time
+
+        self.history = History(maxlen=history_size)
+        self.counts = np.bincount(self.status, minlength=len(Status))
+        self.time = 0
+        self.total_infections = int(self.counts[Status.INFECTED.value])
+        self.quarantine_days = 0
+        self.original_movement_speed = movement_speed
+        self.current_movement_speed = movement_speed
+
+        # Рабочие процессы: барьеры на начало шага, середину (между фазами) и конец
+        params = {
+            'tile_shape': self.tile_shape,
+            'interaction_radius': interaction_radius,
+            'infection_rate': infection_rate,
+            'recovery_time': recovery_time,
+            'immunity_time': immunity_time,
+        }
+        self._start = mp.Barrier(self.workers + 1)
+        self._middle = mp.Barrier(self.workers)
+        self._end = mp.Barrier(self.workers + 1)
+        self._processes = [
+            mp.Process(target=_worker, daemon=True,
+                       args=(tile, spec, params, tile_seeds[tile], self._start, self._middle, self._end))
+            for tile in range(self.workers)
+        ]
+        for process in self._processes:
+            process.start()
+        self._end.wait()  # рабочие разобрали начальных агентов по тайлам
+
+    def step(self):
+        """Один шаг: карантин, параллельная фаза рабочих, вакцинация, история"""
+        self.time += 1
+        S, I, V = Status.SUSCEPTIBLE.value, Status.INFECTED.value, Status.VACCINATED.value
+
+        infected_percent = self.counts[I] / self.size
+        self._apply_quarantine(infected_percent)
+
+        # Сегменты буферов обмена: каждому тайлу столько мест, сколько у него агентов
+        reports = self._arrays['reports']
+        local = reports[:, _LOCAL]
+        self._arrays['offsets'][:] = np.cumsum(local) - local
+        self._arrays['control'][:] = (_STEP, self.current_movement_speed)
+        self._start.wait()
+        self._end.wait()
+
+        self.counts = reports[:, _COUNTS].sum(axis=0)
+        new_infections = int(reports[:, _NEW].sum())
+        self.total_infections += new_infections
+
+        # Вакцинация - глобальная, делается здесь, пока рабочие ждут следующего шага.
+        # Восприимчивых ищем выборкой с отбраковкой, а не проходом по всем N статусам
+        vaccinated = self._vaccinate(self.counts[S], infected_percent)
+        self.counts[S] -= vaccinated
+        self.counts[V] += vaccinated
+
+        self.history.append(self.counts)
+
+    def update(self):
+        self.step()
+        return self.status.copy()
+
+    def run(self, steps):
+        self.history.reserve(steps)
+        for _ in range(steps):
+            self.step()
+        return self
+
+    def close(self):
+        """Останавливает рабочих и освобождает общую память"""
+        if not self._blocks:
+            return
+        if all(process.is_alive() for process in self._processes):
+            self._arrays['control'][0] = _STOP
+            self._start.wait()
+        for process in self._processes:
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+        # Массивы главного процесса становятся недействительными вместе с памятью
+        self.positions = self.positions.copy()
+        self.velocities = self.velocities.copy()
+        self.status = self.status.copy()
+        self.timers = self.timers.copy()
+        self._arrays = {}
+        for shm in self._blocks:
+            shm.close()
+            shm.unlink()
+        self._blocks = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __del__(self):
+        try:
+            self.close()
+        except Exception:
+            pass
@@ -1,11 +1,15 @@
 # Реализация визуализации для симуляции распространения вируса
 
+import queue
+import threading
 import numpy as np
 import matplotlib.pyplot as plt
 import matplotlib.animation as animation
 from matplotlib.colors import ListedColormap
 import matplotlib.patches as mpatches
 from enum import Enum
+from recorder import TrajectoryReader, ReplayPopulation
+from population import quarantine_switch
 
 # Для совместимости с population.py
 class Status(Enum):
@@ -14,14 +18,51 @@ class Status(Enum):
     RECOVERED = 2    # выздоровел (с иммунитетом)
     VACCINATED = 3   # вакцинирован
 
+class LineBuffer:
+    """Предвыделенный буфер точек истории для живого режима.
+    
+    Строка - (день, S, I, R, V). Поток симуляции дописывает строки, поток
+    отрисовки читает первые n. Массив при росте подменяется целиком одной
+    ссылкой, так что читатель всегда видит согласованные данные.
+    """
+    
+    def __init__(self, capacity=1024):
+        self.rows = np.zeros((max(capacity, 16), 5), dtype=np.int64)
+        self.n = 0
+    
+    def append(self, time, counts):
+        if self.n == len(self.rows):
+            rows = np.zeros((2 * len(self.rows), 5), dtype=np.int64)
+            rows[:self.n] = self.rows[:self.n]
+            self.rows = rows
+        self.rows[self.n, 0] = time
+        self.rows[self.n, 1:] = counts
+        self.n += 1  # строка видна читателю только после записи
+    
+    def view(self, max_points=2000):
+        """Первые n строк, прореженные до max_points точек (последняя всегда есть)"""
+        n, rows = self.n, self.rows
+        stride = max(1, -(-n // max_points))
+        if stride == 1:
+            return rows[:n]
+        picked = rows[:n:stride]
+        if (n - 1) % stride:
+            picked = np.vstack([picked, rows[n - 1]])
+        return picked
+
+
 class SimulationVisualizer:
-    def __init__(self, population, frames=1000, interval=20):
+    def __init__(self, population, frames=1000, interval=20, figure=None):
         self.population = population
         self.frames = frames
         self.interval = interval
         
-        # Настраиваем фигуру и оси
-        self.fig, (self.ax1, self.ax2) = plt.subplots(1, 2, figsize=(15, 6))
+        # Настраиваем фигуру и оси (figure - готовая фигура вне pyplot, например для экспорта)
+        if figure is None:
+            self.fig, (self.ax1, self.ax2) = plt.subplots(1, 2, figsize=(15, 6))
+        else:
+            self.fig = figure
+            self.ax1, self.ax2 = figure.subplots(1, 2)
         
         # Настраиваем цветовую схему для точек
         # [здоровый, инфицированный, выздоровевший, вакцинированный]
@@ -49,6 +90,12 @@ class SimulationVisualizer:
         # Настраиваем границы графиков
         self.setup_axes()
         
+    @classmethod
+    def from_recording(cls, path, interval=20):
+        """Визуализатор, который воспроизводит записанные траектории без пересчета модели"""
+        population = ReplayPopulation(TrajectoryReader(path))
+        return cls(population, frames=len(population), interval=interval)
+    
     def setup_axes(self):
         """Настраиваем параметры осей и графиков"""
         # Настройка графика симуляции
@@ -102,29 +149,16 @@ class SimulationVisualizer:
         self.scatter.set_offsets(self.population.positions)
         self.scatter.set_array(self.population.status)
         
-        # Обновление линий на графике истории
-        t = range(len(self.population.history_susceptible))
+        # Обновление линий на графике истории (столбцы истории - это виды, без копирования)
+        t = self.population.history.steps
         self.line_susceptible.set_data(t, self.population.history_susceptible)
         self.line_infected.set_data(t, self.population.history_infected)
         self.line_recovered.set_data(t, self.population.history_recovered)
         self.line_vaccinated.set_data(t, self.population.history_vaccinated)
         
         # Обновление статистики
-        s_count = self.population.history_susceptible[-1]
-        i_count = self.population.history_infected[-1]
-        r_count = self.population.history_recovered[-1]
-        v_count = self.population.history_vaccinated[-1]
-        
-        stats = f'День: {self.population.time}\n'
-        stats += f'Восприимчивые: {s_count} ({s_count/self.population.size*100:.1f}%)\n'
-        stats += f'Инфицированные: {i_count} ({i_count/self.population.size*100:.1f}%)\n'
-        stats += f'Выздоровевшие: {r_count} ({r_count/self.population.size*100:.1f}%)\n'
-        stats += f'Вакцинированные: {v_count} ({v_count/self.population.size*100:.1f}%)'
-        
-        if self.population.quarantine_active:
-            stats += '\n[КАРАНТИН ДЕЙСТВУЕТ]'
-            
-        self.stats_text.set_text(stats)
+        self.stats_text.set_text(self._stats_text(
+            self.population.time, self.population.history.last(), self.population.quarantine_active))
         
         # Автомасштабирование графика истории
         if frame > 0 and frame % 100 == 0:
@@ -140,18 +174,169 @@ class SimulationVisualizer:
             init_func=self.init_animation, blit=True, interval=self.interval
         )
         
-        # Параметры для сохранения (на всякий случай)
-        # self.animation.save('simulation.gif', writer='pillow', fps=20)
+        # Для сохранения в файл см. export(): кадры рисуются параллельно и без окна
         
         plt.tight_layout()
         plt.show()
     
+    def export(self, path, **options):
+        """Считает self.frames шагов без окна и сохраняет видео path (.mp4 или .gif).
+
+        options передаются в export.export_recording: stride, resolution, dpi, fps, workers.
+        """
+        from export import export_video
+        plt.close(self.fig)
+        return export_video(self.population, self.frames, path, **options)
+    
+    def run_live(self, target_fps=30, steps=None, queue_size=2, max_agents_drawn=None,
+                 max_line_points=2000):
+        """Живой режим: симуляция идет в отдельном потоке, окно рисует с частотой target_fps.
+        
+        Поток симуляции кладет снимки состояния в очередь на queue_size мест и
+        никогда ее не ждет: если отрисовка не успевает, старый снимок выбрасывается.
+        Отрисовка берет только самый свежий снимок, а историю дописывает в
+        предвыделенный буфер и рисует прореженной до max_line_points точек.
+        max_agents_drawn - рисовать только случайное подмножество агентов
+        (для популяций в сотни тысяч).
+        """
+        steps = steps or self.frames
+        size = self.population.size
+        if max_agents_drawn and max_agents_drawn < size:
+            self._drawn = np.sort(np.random.default_rng(0).choice(size, max_agents_drawn, replace=False))
+        else:
+            self._drawn = slice(None)
+        self._snapshots = queue.Queue(maxsize=queue_size)
+        self._lines = LineBuffer(steps)
+        self._max_line_points = max_line_points
+        self._stop = threading.Event()
+        self._last_stats = None
+        
+        simulation = threading.Thread(target=self._simulate, args=(steps,), daemon=True)
+        self.animation = animation.FuncAnimation(
+            self.fig, self._draw_live, frames=None, init_func=self._init_live,
+            blit=True, interval=1000 / target_fps, cache_frame_data=False
+        )
+        simulation.start()
+        
+        plt.tight_layout()
+        plt.show()
+        
+        self._stop.set()
+        simulation.join()
+    
+    def _simulate(self, steps):
+        """Поток симуляции: шагает без оглядки на отрисовку"""
+        population = self.population
+        step = getattr(population, 'step', population.update)
+        for _ in range(steps):
+            if self._stop.is_set():
+                break
+            step()
+            self._lines.append(population.time, population.history.last())
+            snapshot = (population.time,
+                        population.positions[self._drawn].copy(),
+                        population.status[self._drawn].copy(),
+                        population.quarantine_active)
+            try:
+                self._snapshots.put_nowait(snapshot)
+            except queue.Full:
+                # отрисовка отстает - выбрасываем самый старый снимок
+                try:
+                    self._snapshots.get_nowait()
+                except queue.Empty:
+                    pass
+                self._snapshots.put_nowait(snapshot)
+        self._stop.set()
+    
+    def _init_live(self):
+        artists = self.init_animation()
+        self.scatter.set_offsets(self.population.positions[self._drawn])
+        self.scatter.set_array(self.population.status[self._drawn])
+        return artists
+    
+    def _draw_live(self, frame):
+        """Кадр живого режима: только самый свежий снимок из очереди"""
+        artists = (self.scatter, self.line_susceptible, self.line_infected,
+                   self.line_recovered, self.line_vaccinated, self.stats_text)
+        snapshot = None
+        while True:
+            try:
+                snapshot = self._snapshots.get_nowait()
+            except queue.Empty:
+                break
+        if snapshot is None:
+            if self._stop.is_set() and self.animation.event_source is not None:
+                self.animation.event_source.stop()  # симуляция закончилась
+            return artists
+        
+        time, positions, status, quarantine_active = snapshot
+        self.scatter.set_offsets(positions)
+        self.scatter.set_array(status)
+        
+        rows = self._lines.view(self._max_line_points)
+        t = rows[:, 0] - 1  # по оси X номер шага с нуля, как в update_frame
+        self.line_susceptible.set_data(t, rows[:, 1])
+        self.line_infected.set_data(t, rows[:, 2])
+        self.line_recovered.set_data(t, rows[:, 3])
+        self.line_vaccinated.set_data(t, rows[:, 4])
+        if len(t) and t[-1] > self.ax2.get_xlim()[1]:
+            self.ax2.set_xlim(0, t[-1] + 100)
+        
+        # Текст статистики пересобираем, только если что-то поменялось
+        current = (time, *rows[-1, 1:], quarantine_active) if len(rows) else None
+        if current is not None and current != self._last_stats:
+            self._last_stats = current
+            self.stats_text.set_text(self._stats_text(time, rows[-1, 1:], quarantine_active))
+        return artists
+    
+    def _stats_text(self, time, counts, quarantine_active):
+        size = self.population.size
+        s_count, i_count, r_count, v_count = counts
+        stats = f'День: {time}\n'
+        stats += f'Восприимчивые: {s_count} ({s_count/size*100:.1f}%)\n'
+        stats += f'Инфицированные: {i_count} ({i_count/size*100:.1f}%)\n'
+        stats += f'Выздоровевшие: {r_count} ({r_count/size*100:.1f}%)\n'
+        stats += f'Вакцинированные: {v_count} ({v_count/size*100:.1f}%)'
+        if quarantine_active:
+            stats += '\n[КАРАНТИН ДЕЙСТВУЕТ]'
+        return stats
+    
+    def _rescan_quarantine_starts(self, t):
+        """Моменты введения карантина, восстановленные по истории зараженных"""
+        quarantine_starts = []
+        in_quarantine = False
+        if not self.population.quarantine_enabled:
+            return quarantine_starts
+        for i in range(len(t)):
+            infected_percent = self.population.history_infected[i] / self.population.size
+            start, stop = quarantine_switch(infected_percent, self.population.quarantine_threshold,
+                                            in_quarantine)
+            if start:
+                quarantine_starts.append(t[i])
+                in_quarantine = True
+            elif stop:
+                in_quarantine = False
+        return quarantine_starts
+    
+    def quarantine_starts(self, t):
+        """Моменты введения карантина по оси шагов t: из журнала мер, если он
+        ведется, иначе восстановленные по истории зараженных. Отмечается шаг
+        истории, на котором доля зараженных перешла порог."""
+        events = getattr(self.population, 'events', None)
+        if events is None:
+            return self._rescan_quarantine_starts(t)
+        # Карантин дня d вводится по числу зараженных после дня d - 1, а это
+        # строка истории d - 2 (строка k - итог дня k + 1)
+        steps = events.policy_steps('quarantine_start').astype(np.int64) - 2
+        # (карантин первого дня вводится по начальному состоянию, его строки в истории нет)
+        return [step for step in steps if len(t) and t[0] <= step <= t[-1]]
+    
     def show_final_results(self):
         """Показывает итоговый график результатов"""
         plt.figure(figsize=(12, 7))
         
         # Данные для графика
-        t = range(len(self.population.history_susceptible))
+        t = self.population.history.steps
         
         # Строим графики для разных групп
         plt.plot(t, self.population.history_susceptible, 
@@ -170,17 +355,7 @@ class SimulationVisualizer:
                      'Начало вакцинации', rotation=90, alpha=0.7)
         
         # Находим первый момент введения карантина
-        quarantine_starts = []
-        in_quarantine = False
-        for i in range(1, len(t)):
-            infected_percent = self.population.history_infected[i] / self.population.size
-            threshold = self.population.quarantine_threshold
-            
-            if infected_percent >= threshold and not in_quarantine and self.population.quarantine_enabled:
-                quarantine_starts.append(i)
-                in_quarantine = True
-            elif infected_percent < threshold * 0.5 and in_quarantine:
-                in_quarantine = False
+        quarantine_starts = self.quarantine_starts(t)
         
         # Рисуем линии карантина
         for q_start in quarantine_starts[:1]:  # показываем только первый карантин
@@ -189,8 +364,9 @@ class SimulationVisualizer:
                      'Введение карантина', rotation=90, alpha=0.7)
         
         # Добавляем аннотации с пиковыми значениями
-        max_infected = max(self.population.history_infected)
-        max_infected_idx = self.population.history_infected.index(max_infected)
+        peak = np.argmax(self.population.history_infected)
+        max_infected = self.population.history_infected[peak]
+        max_infected_idx = t[peak]
         
         plt.annotate(f'Пик инфекции: {max_infected} чел. ({max_infected/self.population.size*100:.1f}%)',
                     xy=(max_infected_idx, max_infected),